@@ -1,23 +1,46 @@
+from __future__ import annotations
+
 import base64
-import http.client
+import hashlib
+import os
 import sys
 import json
 import logging
+import mmap
+import random
+import signal
+import socket
+import socketserver
+import sqlite3
 from argparse import ArgumentParser
-from typing import List, Dict, Optional
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import (
+    ALL_COMPLETED,
+    CancelledError,
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from threading import Event, Lock, Thread, local
+from time import monotonic, sleep, time
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Iterator, List, Dict, Optional, Set, TextIO, Tuple, Union
 from pathlib import Path
 from copy import deepcopy
+from http import HTTPStatus
+from urllib.parse import urlparse
 from uuid import uuid4
 
-import requests
-import quickxorhash
-from bas_metadata_library.standards.iso_19115_2 import MetadataRecordConfigV3 as MetadataRecordConfig
-from bas_metadata_library.standards.iso_19115_common.utils import encode_config_for_json
-from jsonschema.exceptions import ValidationError
-from jsonschema.validators import validate
-from msal import PublicClientApplication
-from requests import HTTPError
-from requests_auth_aws_sigv4 import AWSSigV4
+# dependencies are imported where they're used, so each command only imports what it needs (see 'test-startup.py')
+if TYPE_CHECKING:
+    import requests
+    import quickxorhash
+    from bas_metadata_library.standards.iso_19115_2 import MetadataRecordConfigV3 as MetadataRecordConfig
+    from msal import SerializableTokenCache
+    from requests_auth_aws_sigv4 import AWSSigV4
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -26,8 +49,19 @@ parser = ArgumentParser(
     usage="""poetry python test-chain.py <command> [<args>]
 
 The most commonly used commands are:
-   sign-in     Sign into app using Azure AD account
-   deposit     Deposit artefacts listed in a metadata record for a resource
+   sign-in         Sign into app using Azure AD account
+   deposit         Deposit artefacts listed in a metadata record for a resource
+   deposit-batch   Deposit artefacts for many resources
+   ingest          Process deposit jobs streamed from a JSON Lines file or stdin
+   serve           Run a long-lived service processing deposit jobs from a socket or watched directory
+   submit          Submit a deposit job to a running service
+   validate        Validate metadata records against the service schema
+   hash            Calculate quickXorHash values for local artefacts
+   clear-index     Clear the local index of SharePoint directories and files
+   sync            Sync a local mirror of SharePoint directories, files and metadata
+   links           Get sharing links for artefacts shared with all NERC staff
+   register        Register lookup items for artefacts with the Downloads Proxy
+   lookups         List or export registered lookup items
 """,
 )
 parser.add_argument("command", help="Subcommand to run")
@@ -41,17 +75,172 @@ sharepoint_drive_id: str = "b!N8RhBUx0CkeIfj05Pojk00NcgmMb28pApxcDZQmMcMBzlP8Hkr
 sharepoint_list_id: str = "07ff9473-b492-4cb4-abde-632645191777"
 
 lookup_endpoint = "https://zrpqdlufnfqcmqmzppwzegosvu0rvbca.lambda-url.eu-west-1.on.aws/"
+lookup_concurrency: int = 8  # lookup items to register at once
+lookup_max_retries: int = 3
+lookup_signer_max_age: float = 900  # seconds before AWS credentials are resolved again, as temporary credentials expire
 download_endpoint = "https://data.bas.ac.uk/download-testing"
 
 auth_client_tenancy: str = "https://login.microsoftonline.com/b311db95-32ad-438f-a101-7ba061712a4e"
 auth_client_id: str = "3b2c5acf-728a-4b78-85f0-9560a6aad701"
 auth_client_scopes: List[str] = ["https://graph.microsoft.com/Files.ReadWrite.All"]
 auth_token_path = Path("./auth-token.json")
+auth_token_cache_path = Path("./auth-token-cache.json")
+auth_token_refresh_margin: int = 300  # refresh tokens when they have less than this many seconds left
+
+graph_endpoint: str = "https://graph.microsoft.com/v1.0"
+graph_pool_connections: int = 4  # number of hosts to keep connections for (Graph and upload session hosts)
+graph_pool_maxsize: int = 16  # minimum connections to keep per host, raised to fit `deposit_concurrency` per worker
+graph_batch_max_size: int = 20  # set by Microsoft
+graph_rate_limit: float = 25  # requests per second to each host, on average
+graph_rate_burst: int = 50  # requests that can be made at once to each host, before being limited to `graph_rate_limit`
+graph_max_retries: int = 5
+graph_retry_backoff: float = 1  # seconds, doubled for each retry where Graph doesn't give a 'Retry-After' delay
+graph_retry_max_delay: float = 120  # seconds
+graph_idempotent_methods: Set[str] = {"GET", "HEAD", "PUT", "PATCH", "DELETE"}
+
+state_db_path = Path("./state.db")
+state_db_tables: List[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS upload_journal (
+        drive_id TEXT NOT NULL,
+        directory_id TEXT NOT NULL,
+        file_name TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        file_size INTEGER NOT NULL,
+        file_mtime_ns INTEGER NOT NULL,
+        upload_url TEXT NOT NULL,
+        next_expected_ranges TEXT NOT NULL,
+        PRIMARY KEY (drive_id, directory_id, file_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS hash_cache (
+        file_path TEXT NOT NULL PRIMARY KEY,
+        file_size INTEGER NOT NULL,
+        file_mtime_ns INTEGER NOT NULL,
+        file_inode INTEGER NOT NULL,
+        quickxor_hash TEXT NOT NULL,
+        sha256_hash TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS item_index (
+        drive_id TEXT NOT NULL,
+        parent_id TEXT NOT NULL,
+        item_name TEXT NOT NULL,
+        item_id TEXT NOT NULL,
+        is_folder INTEGER NOT NULL,
+        item_size INTEGER,
+        quickxor_hash TEXT,
+        indexed_at REAL NOT NULL,
+        PRIMARY KEY (drive_id, parent_id, item_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS mirror_items (
+        drive_id TEXT NOT NULL,
+        item_id TEXT NOT NULL,
+        parent_id TEXT,
+        item_name TEXT NOT NULL,
+        is_folder INTEGER NOT NULL,
+        item_size INTEGER,
+        quickxor_hash TEXT,
+        web_url TEXT,
+        list_item_id TEXT,
+        resource_id TEXT,
+        artefact_id TEXT,
+        PRIMARY KEY (drive_id, item_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS mirror_items_parent ON mirror_items (drive_id, parent_id)",
+    "CREATE INDEX IF NOT EXISTS mirror_items_list_item ON mirror_items (drive_id, list_item_id)",
+    "CREATE INDEX IF NOT EXISTS mirror_items_hash ON mirror_items (drive_id, quickxor_hash, item_size)",
+    "CREATE INDEX IF NOT EXISTS mirror_items_size ON mirror_items (drive_id, item_size)",
+    """
+    CREATE TABLE IF NOT EXISTS sharing_links (
+        drive_id TEXT NOT NULL,
+        item_id TEXT NOT NULL,
+        link_url TEXT NOT NULL,
+        PRIMARY KEY (drive_id, item_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS lookup_items (
+        artefact_id TEXT NOT NULL PRIMARY KEY,
+        resource_id TEXT NOT NULL,
+        media_type TEXT NOT NULL,
+        origin_uri TEXT NOT NULL,
+        registered_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS lookup_items_resource ON lookup_items (resource_id)",
+    "CREATE INDEX IF NOT EXISTS lookup_items_origin ON lookup_items (origin_uri)",
+    """
+    CREATE TABLE IF NOT EXISTS delta_links (
+        drive_id TEXT NOT NULL,
+        delta_name TEXT NOT NULL,
+        delta_link TEXT NOT NULL,
+        PRIMARY KEY (drive_id, delta_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+        jobs_path TEXT NOT NULL PRIMARY KEY,
+        file_size INTEGER NOT NULL,
+        file_mtime_ns INTEGER NOT NULL,
+        file_inode INTEGER NOT NULL,
+        job_offset INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+]
+item_index_ttl: int = 3600  # seconds before indexed items are looked up again
+copy_poll_interval: float = 1  # seconds between checking the progress of copying files
+copy_timeout: float = 600  # seconds to wait for files to be copied
+
+upload_simple_max_size: int = 3 * 2**20  # files up to this size are uploaded in a single batch (4 MiB once encoded)
+upload_chunk_size: int = 327680  # set by Microsoft (320 KiB), chunks must be a multiple of this size
+upload_chunk_max_size: int = 192 * upload_chunk_size  # set by Microsoft (60 MiB)
+upload_chunk_initial_size: int = 16 * upload_chunk_size  # 5 MiB, adjusted for each upload based on throughput
+upload_chunk_target_duration: float = 10  # seconds each chunk should take to upload, used to adjust chunk sizes
+upload_chunk_max_errors: int = 5  # failed chunks to upload again (in smaller chunks), per file
+deposit_concurrency: int = 4
+deposit_batch_workers: int = 2
+upload_dedup: bool = True  # copy existing files with the same contents, rather than uploading them again
+deposit_batch_report_path = Path("./deposit-report.jsonl")
+deposit_ingest_queue_size: int = 2 * deposit_batch_workers  # jobs read ahead of workers, limits memory use for ingest
+serve_socket_path = Path("./deposit.sock")
+serve_watch_interval: float = 2  # seconds between checking for new records, records must be unchanged for as long
+hash_max_in_flight_bytes: int = 2**30  # total size of files hashed at once, limits disk thrashing
+
+
+def load_auth_token_cache() -> SerializableTokenCache:
+    from msal import SerializableTokenCache
+
+    auth_token_cache = SerializableTokenCache()
+    if auth_token_cache_path.resolve().exists():
+        logging.debug(f"Loading auth token cache from: '{auth_token_cache_path.resolve()}'")
+        with open(auth_token_cache_path.resolve(), mode="r") as auth_token_cache_file:
+            auth_token_cache.deserialize(auth_token_cache_file.read())
+    return auth_token_cache
+
+
+def save_auth_payload(auth_payload: dict, auth_token_cache: SerializableTokenCache) -> None:
+    logging.debug(f"Saving auth payload to auth file at: '{auth_token_path.resolve()}'")
+    with open(auth_token_path.resolve(), mode="w") as auth_token_file:
+        json.dump(auth_payload, auth_token_file, indent=2)
+    if auth_token_cache.has_state_changed:
+        logging.debug(f"Saving auth token cache to: '{auth_token_cache_path.resolve()}'")
+        with open(auth_token_cache_path.resolve(), mode="w") as auth_token_cache_file:
+            auth_token_cache_file.write(auth_token_cache.serialize())
 
 
 def auth_sign_in() -> None:
+    from msal import PublicClientApplication
+
+    auth_token_cache = load_auth_token_cache()
     auth_client_public: PublicClientApplication = PublicClientApplication(
-        client_id=auth_client_id, authority=auth_client_tenancy
+        client_id=auth_client_id, authority=auth_client_tenancy, token_cache=auth_token_cache
     )
 
     logging.debug("Generating device sign-in flow")
@@ -64,25 +253,458 @@ def auth_sign_in() -> None:
     auth_payload = auth_client_public.acquire_token_by_device_flow(auth_flow)
     logging.debug(f"Auth payload:")
     logging.debug(auth_payload)
-    logging.debug(f"Saving auth payload to auth file at: '{auth_token_path.resolve()}'")
-    with open(auth_token_path.resolve(), mode="w") as auth_token_file:
-        json.dump(auth_payload, auth_token_file, indent=2)
+    if "expires_in" in auth_payload:
+        auth_payload["expires_at"] = int(time()) + int(auth_payload["expires_in"])
+    save_auth_payload(auth_payload=auth_payload, auth_token_cache=auth_token_cache)
     logging.info(f"Authentication token written to auth file at: '{auth_token_path.resolve()}'")
 
 
+class AuthTokenProvider:
+    """
+    Provides auth tokens for Graph requests
+
+    The auth payload saved by `auth_sign_in()` is loaded once and kept in memory, rather than read for each request.
+    Tokens are refreshed shortly before they expire (within `refresh_margin` seconds), using the MSAL token cache, or
+    the refresh token in the auth payload, with the refreshed payload and cache saved for later runs.
+
+    Tokens are accessed under a lock, so a provider can be shared between threads, and between asyncio tasks (as
+    `get_token()` never awaits whilst holding the lock).
+    """
+
+    def __init__(self, refresh_margin: int = auth_token_refresh_margin):
+        self.refresh_margin = refresh_margin
+        self._lock = Lock()
+        self._payload: Optional[dict] = None
+        self._expires_at: float = 0
+
+    def _load(self) -> None:
+        logging.info(f"Loading auth token from auth file at: '{auth_token_path.resolve()}'")
+        if not auth_token_path.resolve().exists():
+            logging.error(f"Auth token file '{auth_token_path.resolve()}' does not exist")
+            raise RuntimeError(f"Auth token file '{auth_token_path.resolve()}' does exist")
+        with open(auth_token_path.resolve(), mode="r") as auth_file:
+            auth_data = json.load(auth_file)
+        if "access_token" not in auth_data:
+            logging.error(f"Auth token file '{auth_token_path.resolve()}' does not contain 'access_token' property")
+            raise RuntimeError(
+                f"Auth token file '{auth_token_path.resolve()}' does not contain 'access_token' property"
+            )
+
+        self._payload = auth_data
+        # auth files from before expiry times were recorded are assumed to be as old as the file
+        self._expires_at = auth_data.get(
+            "expires_at", auth_token_path.resolve().stat().st_mtime + int(auth_data.get("expires_in", 0))
+        )
+        logging.debug(f"Auth token expires at: {self._expires_at}")
+
+    def _refresh(self) -> None:
+        from msal import PublicClientApplication
+
+        logging.info("Refreshing auth token")
+        auth_token_cache = load_auth_token_cache()
+        auth_client_public: PublicClientApplication = PublicClientApplication(
+            client_id=auth_client_id, authority=auth_client_tenancy, token_cache=auth_token_cache
+        )
+
+        auth_payload: Optional[dict] = None
+        auth_accounts = auth_client_public.get_accounts()
+        if len(auth_accounts) > 0:
+            auth_payload = auth_client_public.acquire_token_silent(
+                scopes=auth_client_scopes, account=auth_accounts[0], force_refresh=True
+            )
+        if (auth_payload is None or "access_token" not in auth_payload) and "refresh_token" in self._payload:
+            logging.debug("Refreshing auth token using refresh token in auth file")
+            auth_payload = auth_client_public.acquire_token_by_refresh_token(
+                refresh_token=self._payload["refresh_token"], scopes=auth_client_scopes
+            )
+        if auth_payload is None or "access_token" not in auth_payload:
+            logging.error("Auth token has expired and cannot be refreshed, sign in again")
+            logging.debug(auth_payload)
+            raise RuntimeError("Auth token has expired and cannot be refreshed, sign in again")
+
+        auth_payload["expires_at"] = int(time()) + int(auth_payload["expires_in"])
+        if "refresh_token" not in auth_payload and "refresh_token" in self._payload:
+            auth_payload["refresh_token"] = self._payload["refresh_token"]
+        save_auth_payload(auth_payload=auth_payload, auth_token_cache=auth_token_cache)
+        self._payload = auth_payload
+        self._expires_at = auth_payload["expires_at"]
+        logging.info("Auth token refreshed")
+
+    def get_token(self) -> str:
+        with self._lock:
+            if self._payload is None:
+                self._load()
+            if time() >= self._expires_at - self.refresh_margin:
+                self._refresh()
+            return self._payload["access_token"]
+
+
+_auth_token_provider = AuthTokenProvider()
+
+
 def get_auth_token() -> str:
-    logging.info(f"Loading auth token from auth file at: '{auth_token_path.resolve()}'")
-    if not auth_token_path.resolve().exists():
-        logging.error(f"Auth token file '{auth_token_path.resolve()}' does not exist")
-        raise RuntimeError(f"Auth token file '{auth_token_path.resolve()}' does exist")
-    with open(auth_token_path.resolve(), mode="r") as auth_file:
-        auth_data = json.load(auth_file)
+    return _auth_token_provider.get_token()
+
+
+@contextmanager
+def open_state_db() -> Iterator[sqlite3.Connection]:
+    """
+    Open the local state database, used to record progress and cache information between runs
+
+    Changes are committed when the context exits without error. Tables are created as needed.
+    """
+    state_db = sqlite3.connect(state_db_path.resolve(), timeout=30)
+    state_db.row_factory = sqlite3.Row
     try:
-        logging.debug(f"Return auth token: '{auth_data['access_token']}'")
-        return auth_data["access_token"]
-    except KeyError:
-        logging.error(f"Auth token file '{auth_token_path.resolve()}' does not contain 'access_token' property")
-        raise RuntimeError(f"Auth token file '{auth_token_path.resolve()}' does not contain 'access_token' property")
+        with state_db:
+            for state_db_table in state_db_tables:
+                state_db.execute(state_db_table)
+            yield state_db
+    finally:
+        state_db.close()
+
+
+graph_retry_status_codes: Set[int] = {
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+}
+
+
+def get_retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """
+    Get how long to wait before retrying a request
+
+    Where Graph gives a delay ('Retry-After', in seconds), it's used with a small amount of jitter added. Otherwise,
+    delays back off exponentially from `graph_retry_backoff`, with 'full' jitter. Jitter spreads retries out, so
+    requests throttled at the same time aren't all retried at the same time (and throttled again).
+    """
+    if retry_after is not None and retry_after.isdigit():
+        return min(float(retry_after) + random.uniform(0, graph_retry_backoff), graph_retry_max_delay)
+    return random.uniform(0, min(graph_retry_backoff * 2**attempt, graph_retry_max_delay))
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter, shared by threads making requests to the same host
+
+    Allows up to `capacity` requests at once, then `rate` requests per second on average. The limiter can also be
+    paused (e.g. when throttled), so no requests are made until the pause ends.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = monotonic()
+        self._paused_until = 0.0
+        self._lock = Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            sleep(wait_for)
+
+    def pause(self, delay: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, monotonic() + delay)
+
+
+class GraphClient:
+    """
+    Client for the Microsoft Graph API
+
+    All requests to Graph (and to upload session URLs it returns) share a single pooled session, so connections to each
+    host are kept alive and reused between requests, rather than each request making a new TCP and TLS connection.
+
+    Relative URLs (e.g. '/drives/...') are resolved against the Graph endpoint. Requests are authenticated with the
+    current auth token unless `authenticate` is False (e.g. for pre-authenticated upload session URLs).
+
+    Requests are made through `request()` only, so the transport (currently `requests`, which only supports HTTP/1.1)
+    can be replaced with one supporting HTTP/2 without changing callers.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = graph_endpoint,
+        pool_connections: int = graph_pool_connections,
+        pool_maxsize: int = graph_pool_maxsize,
+    ):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.endpoint = endpoint
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._rate_limiters: Dict[str, RateLimiter] = {}
+        self._rate_limiters_lock = Lock()
+
+    def _get_rate_limiter(self, url: str) -> "RateLimiter":
+        host = urlparse(url).netloc
+        with self._rate_limiters_lock:
+            if host not in self._rate_limiters:
+                self._rate_limiters[host] = RateLimiter(rate=graph_rate_limit, capacity=graph_rate_burst)
+            return self._rate_limiters[host]
+
+    def request(
+        self, method: str, url: str, authenticate: bool = True, idempotent: Optional[bool] = None, **kwargs
+    ) -> requests.Response:
+        """
+        Make a request, rate limited and retried where throttled or failed
+
+        Requests to each host are rate limited (see `RateLimiter`). Throttled requests (429 Too Many Requests) are
+        always retried, as Graph rejects them without processing them. Where requests may have been processed (e.g. for
+        503 Service Unavailable or connection errors), they are only retried if repeating them is safe: by default for
+        GET, PUT (e.g. upload chunks), PATCH and DELETE requests, or other requests where `idempotent` is set.
+
+        Retries wait for the delay Graph gives (the 'Retry-After' header), or back off exponentially otherwise, with
+        jitter (see `get_retry_delay()`). Throttling pauses all requests to the same host, not just those retried.
+
+        The final response is returned as normal (including errors) once retries are exhausted.
+        """
+        import requests
+
+        if url.startswith("/"):
+            url = f"{self.endpoint}{url}"
+        if idempotent is None:
+            idempotent = method in graph_idempotent_methods
+        rate_limiter = self._get_rate_limiter(url=url)
+        _headers = kwargs.pop("headers", {})
+
+        for attempt in range(graph_max_retries + 1):
+            # auth tokens may be refreshed between attempts
+            headers = dict(_headers)
+            if authenticate:
+                headers["Authorization"] = f"Bearer {get_auth_token()}"
+            rate_limiter.acquire()
+            logging.debug(f"Graph request: {method} {url}")
+            try:
+                response = self.session.request(method=method, url=url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not idempotent or attempt == graph_max_retries:
+                    raise
+                retry_delay = get_retry_delay(attempt=attempt)
+                logging.warning(f"Graph request failed ({e}), retrying in {retry_delay:.1f}s")
+                sleep(retry_delay)
+                continue
+
+            if attempt == graph_max_retries or not (
+                response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+                or (idempotent and response.status_code in graph_retry_status_codes)
+            ):
+                return response
+            retry_delay = get_retry_delay(attempt=attempt, retry_after=response.headers.get("Retry-After"))
+            logging.warning(
+                f"Graph request throttled or failed ({response.status_code}), retrying in {retry_delay:.1f}s "
+                f"[{attempt + 1}/{graph_max_retries}]"
+            )
+            if response.status_code in [HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE]:
+                rate_limiter.pause(delay=retry_delay)
+            else:
+                sleep(retry_delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request(method="GET", url=url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request(method="POST", url=url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request(method="PUT", url=url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.request(method="PATCH", url=url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request(method="DELETE", url=url, **kwargs)
+
+
+class GraphBatchResponse:
+    """
+    Response to a request sent as part of a Graph JSON batch
+
+    Mirrors the parts of `requests.Response` used by callers, so errors for individual requests are raised as
+    `HTTPError`s (with this object as the response) in the same way as for requests sent individually.
+    """
+
+    def __init__(self, request_id: str, status_code: int, headers: Dict[str, str], body: Optional[dict]):
+        self.request_id = request_id
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> Optional[dict]:
+        return self.body
+
+    def raise_for_status(self) -> None:
+        from requests import HTTPError
+
+        if not self.ok:
+            raise HTTPError(
+                f"{self.status_code} Error for batch request '{self.request_id}': {self.body}", response=self
+            )
+
+
+class GraphBatch:
+    """
+    Collects independent Graph requests to send together using JSON batching
+
+    Requests are sent in as few batches as possible (of up to 20 requests, a Graph limit). Requests that depend on
+    another (using `depends_on`) are sent in the same batch, in order, as Graph requires. Graph will not run requests
+    whose dependencies fail, returning a 424 (Failed Dependency) status for them instead.
+
+    `add()` returns an ID for each request, used to get its response from the result of `send()`. Errors are returned
+    per request, rather than raised, so callers can check (and raise) errors for each request they're interested in.
+    """
+
+    def __init__(self, client: GraphClient):
+        self.client = client
+        self._requests: List[dict] = []
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def add(
+        self,
+        method: str,
+        url: str,
+        json: Optional[dict] = None,
+        headers: Optional[Dict[str, str]] = None,
+        depends_on: Optional[List[str]] = None,
+        data: Optional[bytes] = None,
+    ) -> str:
+        """
+        Add a request to the batch, returning its ID
+
+        Request bodies are either JSON (`json`) or binary (`data`, which Graph requires to be base64 encoded within a
+        batch, with a 'Content-Type' header set in `headers`).
+        """
+        if not url.startswith("/"):
+            raise RuntimeError("Batched requests must use relative URLs")
+        request = {"id": str(len(self._requests) + 1), "method": method, "url": url}
+        if json is not None:
+            request["body"] = json
+            request["headers"] = {"Content-Type": "application/json"}
+        if data is not None:
+            request["body"] = base64.b64encode(data).decode()
+        if headers is not None:
+            request["headers"] = {**request.get("headers", {}), **headers}
+        if depends_on is not None:
+            request["dependsOn"] = depends_on
+        self._requests.append(request)
+        return request["id"]
+
+    def _group_requests(self) -> List[List[dict]]:
+        # requests, and requests depending on them, form groups that must be sent in the same batch
+        group_ids: Dict[str, str] = {}
+        for request in self._requests:
+            group_ids[request["id"]] = request["id"]
+            for dependency_id in request.get("dependsOn", []):
+                dependency_group_id = group_ids[dependency_id]
+                for _request_id, _group_id in group_ids.items():
+                    if _group_id == dependency_group_id:
+                        group_ids[_request_id] = request["id"]
+        groups: Dict[str, List[dict]] = {}
+        for request in self._requests:
+            groups.setdefault(group_ids[request["id"]], []).append(request)
+
+        batches: List[List[dict]] = [[]]
+        for group in groups.values():
+            if len(group) > graph_batch_max_size:
+                raise RuntimeError(f"Dependent requests cannot exceed the batch limit of {graph_batch_max_size}")
+            if len(batches[-1]) + len(group) > graph_batch_max_size:
+                batches.append([])
+            batches[-1].extend(group)
+        return [batch for batch in batches if len(batch) > 0]
+
+    @staticmethod
+    def _get_throttled_requests(batch: List[dict], responses: Dict[str, GraphBatchResponse]) -> List[dict]:
+        # requests depending on a throttled request fail (424) without running, so are retried with it
+        retry_ids: Set[str] = set()
+        retry_requests: List[dict] = []
+        for request in batch:
+            status_code = responses[request["id"]].status_code
+            depends_on = [dependency_id for dependency_id in request.get("dependsOn", []) if dependency_id in retry_ids]
+            if status_code == HTTPStatus.TOO_MANY_REQUESTS or (
+                status_code == HTTPStatus.FAILED_DEPENDENCY and len(depends_on) > 0
+            ):
+                retry_ids.add(request["id"])
+                retry_request = {key: value for key, value in request.items() if key != "dependsOn"}
+                if len(depends_on) > 0:
+                    retry_request["dependsOn"] = depends_on
+                retry_requests.append(retry_request)
+        return retry_requests
+
+    def send(self) -> Dict[str, GraphBatchResponse]:
+        """
+        Send requests, returning responses by request ID
+
+        Graph may throttle individual requests within a batch (429 status). These requests (and any depending on them)
+        are sent again after the longest delay Graph gives, up to `graph_max_retries` times.
+        """
+        responses: Dict[str, GraphBatchResponse] = {}
+        for batch in self._group_requests():
+            for attempt in range(graph_max_retries + 1):
+                logging.debug(f"Sending batch of {len(batch)} requests")
+                batch_response = self.client.post(url="/$batch", json={"requests": batch})
+                batch_response.raise_for_status()
+                for response in batch_response.json()["responses"]:
+                    responses[response["id"]] = GraphBatchResponse(
+                        request_id=response["id"],
+                        status_code=response["status"],
+                        headers=response.get("headers", {}),
+                        body=response.get("body"),
+                    )
+
+                batch = self._get_throttled_requests(batch=batch, responses=responses)
+                if len(batch) == 0 or attempt == graph_max_retries:
+                    break
+                retry_delay = max(
+                    get_retry_delay(attempt=attempt, retry_after=responses[request["id"]].headers.get("Retry-After"))
+                    for request in batch
+                )
+                logging.warning(
+                    f"{len(batch)} batched Graph requests throttled, retrying in {retry_delay:.1f}s "
+                    f"[{attempt + 1}/{graph_max_retries}]"
+                )
+                sleep(retry_delay)
+        self._requests = []
+        return responses
+
+
+_graph_client: Optional[GraphClient] = None
+_graph_client_lock = Lock()
+
+
+def get_graph_client(workers: int = 1) -> GraphClient:
+    """
+    Get the shared Graph client, creating it if needed
+
+    The connection pool is sized for `workers` deposits at once, each uploading up to `deposit_concurrency` artefacts,
+    so connections aren't discarded and opened again when all workers are busy. As the client is shared, `workers` only
+    applies when it's created, so commands using more than one worker should get the client before starting them.
+    """
+    global _graph_client
+
+    with _graph_client_lock:
+        if _graph_client is None:
+            pool_maxsize = max(graph_pool_maxsize, deposit_concurrency * workers)
+            logging.debug(f"Creating Graph client with {pool_maxsize} connections per host")
+            _graph_client = GraphClient(pool_connections=graph_pool_connections, pool_maxsize=pool_maxsize)
+        return _graph_client
 
 
 def list_resources() -> List[str]:
@@ -111,12 +733,57 @@ def get_record_config(resource_id: str) -> MetadataRecordConfig:
         logging.error(f"Resource '{resource_id}' not mapped to record path")
         raise RuntimeError(e)
 
+    return load_record_config(record_path=record_path)
+
+
+def load_record_config(record_path: Path) -> MetadataRecordConfig:
+    from bas_metadata_library.standards.iso_19115_2 import MetadataRecordConfigV3 as MetadataRecordConfig
+
     record_config = MetadataRecordConfig()
     record_config.load(file=record_path)
 
     return record_config
 
 
+_record_schema: Optional[Tuple[Tuple[int, int], dict, Any]] = None
+_record_schema_lock = Lock()
+_record_validators = local()
+
+
+def get_record_validator() -> Any:
+    """
+    Get a validator for the service specific JSON Schema, for use in the current thread
+
+    The schema is loaded and checked once, unless the schema file changes. Validators (and their ref resolvers) are
+    not thread safe, as resolvers track the scope of refs being resolved, so each thread gets its own validator. The
+    resolvers for each thread share a store of resolved schemas, so remote schemas are only fetched once.
+    """
+    from jsonschema.validators import RefResolver, validator_for
+
+    global _record_schema
+
+    schema_stat = schema_path.stat()
+    schema_version = (schema_stat.st_mtime_ns, schema_stat.st_size)
+    with _record_schema_lock:
+        if _record_schema is None or _record_schema[0] != schema_version:
+            logging.debug("Loading service specific JSON Schema for validation")
+            logging.debug(f"Service schema path: '{schema_path}'")
+            with open(schema_path, mode="r") as schema_file:
+                schema_data = json.load(schema_file)
+            validator_for(schema_data).check_schema(schema_data)
+            _record_schema = (schema_version, schema_data, RefResolver.from_schema(schema_data).store)
+        record_schema = _record_schema
+
+    thread_validator = getattr(_record_validators, "validator", None)
+    if thread_validator is None or thread_validator[0] != record_schema[0]:
+        _, schema_data, schema_store = record_schema
+        resolver = RefResolver.from_schema(schema_data)
+        resolver.store = schema_store
+        thread_validator = (record_schema[0], validator_for(schema_data)(schema_data, resolver=resolver))
+        _record_validators.validator = thread_validator
+    return thread_validator[1]
+
+
 def validate_record_config(record_config: MetadataRecordConfig) -> None:
     """
     Validate metadata record configuration for resource
@@ -124,29 +791,68 @@ def validate_record_config(record_config: MetadataRecordConfig) -> None:
     The record config will already be valid against the base schema for the record config class, this method checks the
     config is valid against the schema specific to this service too.
     """
+    from bas_metadata_library.standards.iso_19115_common.utils import encode_config_for_json
+    from jsonschema.exceptions import best_match
+
     logging.debug("Encoding record config as JSON for validation")
     _config = encode_config_for_json(config=deepcopy(record_config.config))
 
-    logging.debug("Loading service specific JSON Schema for validation")
-    logging.debug(f"Service schema path: '{schema_path}'")
-    with open(schema_path, mode="r") as schema_file:
-        schema_data = json.load(schema_file)
-    _schema = schema_data
-
-    try:
-        validate(instance=_config, schema=_schema)
-    except ValidationError as e:
+    validation_error = best_match(get_record_validator().iter_errors(_config))
+    if validation_error is not None:
         logging.error(f"Record configuration not valid against service specific JSON Schema")
-        raise RuntimeError("Record configuration not valid against service specific JSON Schema") from e
+        raise RuntimeError("Record configuration not valid against service specific JSON Schema") from validation_error
+
 
+def validate_record_file(record_path: Path) -> List[str]:
+    """
+    Validate a metadata record configuration file against the service specific JSON Schema
+
+    Returns all validation errors, rather than raising the first, so records can be checked in bulk.
+    """
+    from bas_metadata_library.standards.iso_19115_2 import MetadataRecordConfigV3 as MetadataRecordConfig
+    from bas_metadata_library.standards.iso_19115_common.utils import encode_config_for_json
 
-def save_record_config(record_config: MetadataRecordConfig) -> None:
     try:
-        record_path = get_record_path(resource_id=record_config.config["file_identifier"])
-        logging.debug(f"Record location matched to '{record_path}'")
-    except LookupError as e:
-        logging.error(f"Resource '{record_config.config['file_identifier']}' not mapped to record path")
-        raise RuntimeError(e)
+        record_config = MetadataRecordConfig()
+        record_config.load(file=record_path)
+        _config = encode_config_for_json(config=deepcopy(record_config.config))
+    except Exception as e:
+        return [f"Record configuration cannot be loaded: {e}"]
+
+    validation_errors = []
+    try:
+        for validation_error in sorted(get_record_validator().iter_errors(_config), key=lambda error: list(error.path)):
+            validation_path = "/".join([str(path) for path in validation_error.absolute_path])
+            validation_errors.append(f"'/{validation_path}': {validation_error.message}")
+    except Exception as e:
+        return [f"Record configuration cannot be validated: {e}"]
+    return validation_errors
+
+
+def validate_record_files(record_paths: List[Path], workers: Optional[int] = None) -> Iterator[Tuple[Path, List[str]]]:
+    """
+    Validate many metadata record configuration files in parallel, for pre-flight checks across a catalogue
+
+    Records are validated using a pool of processes (each building its own validator once). Results are returned as
+    each record is validated, with a list of all validation errors for each record (empty if valid).
+    """
+    logging.info(f"Validating {len(record_paths)} records")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        validations = {
+            executor.submit(validate_record_file, record_path=record_path): record_path for record_path in record_paths
+        }
+        for validation in as_completed(validations):
+            yield validations[validation], validation.result()
+
+
+def save_record_config(record_config: MetadataRecordConfig, record_path: Optional[Path] = None) -> None:
+    if record_path is None:
+        try:
+            record_path = get_record_path(resource_id=record_config.config["file_identifier"])
+            logging.debug(f"Record location matched to '{record_path}'")
+        except LookupError as e:
+            logging.error(f"Resource '{record_config.config['file_identifier']}' not mapped to record path")
+            raise RuntimeError(e)
 
     logging.info(f"Saving record configuration to: '{record_path}'")
     record_config.dump(file=record_path)
@@ -157,8 +863,111 @@ def save_record_config(record_config: MetadataRecordConfig) -> None:
         json.dump(record_data, record_file, indent=2)
 
 
-def hash_file_quickxor(file_path: Path) -> str:
+@contextmanager
+def map_file(file_path: Path) -> Iterator[memoryview]:
+    """
+    Memory map a file as a read-only view
+
+    Slicing the view gives chunks of the file without copying them, which can be used directly as request bodies. The
+    file must not be empty.
+    """
+    with open(file_path, mode="rb") as mapped_file:
+        file_map = mmap.mmap(mapped_file.fileno(), length=0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, "MADV_SEQUENTIAL"):
+        file_map.madvise(mmap.MADV_SEQUENTIAL)
+    file_view = memoryview(file_map)
+    try:
+        yield file_view
+    finally:
+        file_view.release()
+        try:
+            file_map.close()
+        except BufferError:
+            # slices of the view are still referenced elsewhere (e.g. by a failed request), the map will be closed once
+            # these are garbage collected instead
+            logging.debug(f"Cannot close memory map for '{file_path}' whilst chunks are in use")
+
+
+def release_file_chunk(file_view: memoryview, chunk_start: int, chunk_end: int) -> None:
+    """
+    Release the pages for a chunk of a memory mapped file once it's no longer needed
+
+    Mapped pages count towards the memory use of this process until released, even though they're backed by the file.
+    Releasing pages once each chunk is uploaded keeps memory use in line with the chunks in flight, rather than growing
+    to the size of the file. `chunk_start` must be a multiple of the page size (as multiples of 320 KiB are).
+    """
+    if not hasattr(mmap, "MADV_DONTNEED"):
+        return
+    file_view.obj.madvise(mmap.MADV_DONTNEED, chunk_start, chunk_end - chunk_start)
+
+
+def encode_quickxor_hash(quickxor: quickxorhash.quickxorhash) -> str:
+    return base64.b64encode(quickxor.digest()).decode()
+
+
+def get_cached_file_hashes(file_path: Path) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Get hashes for a file from the hash cache, if the file hasn't changed since they were calculated
+
+    Files are considered unchanged if their size, modification time and inode are the same.
+    """
+    file_stat = file_path.stat()
+    with open_state_db() as state_db:
+        cached_hashes = state_db.execute(
+            "SELECT quickxor_hash, sha256_hash FROM hash_cache "
+            "WHERE file_path = ? AND file_size = ? AND file_mtime_ns = ? AND file_inode = ?",
+            (str(file_path.resolve()), file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino),
+        ).fetchone()
+    if cached_hashes is None:
+        return None
+    logging.debug(f"Using cached hashes for '{file_path}'")
+    return dict(cached_hashes)
+
+
+def set_cached_file_hashes(
+    file_path: Path, file_stat: os.stat_result, quickxor_hash: str, sha256_hash: Optional[str] = None
+) -> None:
+    """
+    Record hashes for a file in the hash cache
+
+    `file_stat` should be taken before the file was hashed, so changes made whilst hashing invalidate the hashes.
+    Existing SHA-256 hashes are kept where not given and still valid.
+    """
+    with open_state_db() as state_db:
+        state_db.execute(
+            "INSERT INTO hash_cache VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (file_path) DO UPDATE SET "
+            "sha256_hash = CASE WHEN file_size = excluded.file_size AND file_mtime_ns = excluded.file_mtime_ns "
+            "AND file_inode = excluded.file_inode THEN coalesce(excluded.sha256_hash, sha256_hash) "
+            "ELSE excluded.sha256_hash END, "
+            "file_size = excluded.file_size, file_mtime_ns = excluded.file_mtime_ns, "
+            "file_inode = excluded.file_inode, quickxor_hash = excluded.quickxor_hash",
+            (
+                str(file_path.resolve()),
+                file_stat.st_size,
+                file_stat.st_mtime_ns,
+                file_stat.st_ino,
+                quickxor_hash,
+                sha256_hash,
+            ),
+        )
+
+
+def hash_file(file_path: Path, sha256: bool = False) -> Dict[str, Optional[str]]:
+    """
+    Calculate the quickXorHash (as used by SharePoint), and optionally SHA-256 hash, of a file
+
+    Hashes are taken from the hash cache where the file hasn't changed, otherwise the file is read (once, for both
+    hashes) and the cache updated.
+    """
+    import quickxorhash
+
+    cached_hashes = get_cached_file_hashes(file_path=file_path)
+    if cached_hashes is not None and (not sha256 or cached_hashes["sha256_hash"] is not None):
+        return cached_hashes
+
+    file_stat = file_path.stat()
     quickxor = quickxorhash.quickxorhash()
+    sha256_hash = hashlib.sha256() if sha256 else None
     quickxor_block_size = 2**20
 
     with open(file_path, mode="rb") as hash_file:
@@ -167,30 +976,428 @@ def hash_file_quickxor(file_path: Path) -> str:
             if not data:
                 break
             quickxor.update(data)
+            if sha256_hash is not None:
+                sha256_hash.update(data)
 
-    return base64.b64encode(quickxor.digest()).decode()
+    hashes = {
+        "quickxor_hash": encode_quickxor_hash(quickxor),
+        "sha256_hash": sha256_hash.hexdigest() if sha256_hash is not None else None,
+    }
+    set_cached_file_hashes(file_path=file_path, file_stat=file_stat, **hashes)
+    return hashes
 
 
-def get_sharepoint_directory(directory_name: Optional[str] = None, directory_id: Optional[str] = None) -> dict:
+def hash_file_quickxor(file_path: Path) -> str:
+    return hash_file(file_path=file_path)["quickxor_hash"]
+
+
+def hash_files(
+    file_paths: List[Path], workers: Optional[int] = None, max_in_flight_bytes: Optional[int] = None
+) -> Iterator[Tuple[Path, Optional[str], Optional[str]]]:
+    """
+    Calculate the quickXorHash of many files in parallel, for pre-flight checks and audits of local artefacts
+
+    Files are hashed using a pool of processes (see `hash_file_quickxor()`), with hashes for unchanged files taken from
+    the hash cache without using the pool. To avoid thrashing the disk, files are only submitted whilst the total size
+    of files being hashed is within `max_in_flight_bytes` (though at least one file is always hashed, however large).
+
+    Results are returned as each file is hashed, as the file path, its hash and any error (e.g. file not found).
+    """
+    if max_in_flight_bytes is None:
+        max_in_flight_bytes = hash_max_in_flight_bytes
+
+    logging.info(f"Hashing {len(file_paths)} files")
+    pending_paths: List[Tuple[Path, int]] = []
+    for file_path in file_paths:
+        try:
+            cached_hashes = get_cached_file_hashes(file_path=file_path)
+            if cached_hashes is not None:
+                yield file_path, cached_hashes["quickxor_hash"], None
+                continue
+            pending_paths.append((file_path, file_path.stat().st_size))
+        except OSError as e:
+            yield file_path, None, str(e)
+
+    in_flight_bytes = 0
+    hashings: Dict[Future, Tuple[Path, int]] = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending_paths.reverse()
+        while pending_paths or hashings:
+            while pending_paths and (not hashings or in_flight_bytes + pending_paths[-1][1] <= max_in_flight_bytes):
+                file_path, file_size = pending_paths.pop()
+                hashings[executor.submit(hash_file_quickxor, file_path=file_path)] = (file_path, file_size)
+                in_flight_bytes += file_size
+
+            done, _ = wait(hashings, return_when=FIRST_COMPLETED)
+            for hashing in done:
+                file_path, file_size = hashings.pop(hashing)
+                in_flight_bytes -= file_size
+                try:
+                    yield file_path, hashing.result(), None
+                except OSError as e:
+                    yield file_path, None, str(e)
+
+
+def get_indexed_item(parent_id: str, item_name: str) -> Optional[dict]:
+    """
+    Get an item from the local index of the drive, if indexed within the last `item_index_ttl` seconds
+
+    Items are returned as a subset of their drive item (ID, name, and size and quickXorHash (if known) for files).
+    Directories within the root of the drive use 'root' as their parent ID.
+    """
+    with open_state_db() as state_db:
+        entry = state_db.execute(
+            "SELECT * FROM item_index WHERE drive_id = ? AND parent_id = ? AND item_name = ? AND indexed_at > ?",
+            (sharepoint_drive_id, parent_id, item_name, time() - item_index_ttl),
+        ).fetchone()
+    if entry is None:
+        return None
+    logging.debug(f"Using indexed item for '{item_name}' in '{parent_id}'")
+    item_data = {"id": entry["item_id"], "name": entry["item_name"], "parentReference": {"id": parent_id}}
+    if entry["is_folder"]:
+        item_data["folder"] = {}
+        return item_data
+    item_data["size"] = entry["item_size"]
+    item_data["file"] = {"hashes": {}}
+    if entry["quickxor_hash"] is not None:
+        item_data["file"]["hashes"]["quickXorHash"] = entry["quickxor_hash"]
+    return item_data
+
+
+def set_indexed_item(parent_id: str, item_data: dict) -> None:
+    """
+    Add or update an item in the local index of the drive, from its drive item (e.g. as returned when created)
+    """
+    with open_state_db() as state_db:
+        state_db.execute(
+            "INSERT OR REPLACE INTO item_index VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                sharepoint_drive_id,
+                parent_id,
+                item_data["name"],
+                item_data["id"],
+                "folder" in item_data,
+                item_data.get("size"),
+                item_data.get("file", {}).get("hashes", {}).get("quickXorHash"),
+                time(),
+            ),
+        )
+
+
+def invalidate_indexed_items(parent_id: Optional[str] = None, item_name: Optional[str] = None) -> None:
+    """
+    Remove items from the local index of the drive, so they are looked up again
+
+    With no arguments, the whole index is cleared. With `parent_id`, all items within a directory are removed, and with
+    `item_name` as well, only that item.
+    """
+    query = "DELETE FROM item_index WHERE drive_id = ?"
+    params: List[str] = [sharepoint_drive_id]
+    if parent_id is not None:
+        query += " AND parent_id = ?"
+        params.append(parent_id)
+    if item_name is not None:
+        query += " AND item_name = ?"
+        params.append(item_name)
+    with open_state_db() as state_db:
+        state_db.execute(query, params)
+
+
+def get_delta_link(delta_name: str) -> Optional[str]:
+    with open_state_db() as state_db:
+        entry = state_db.execute(
+            "SELECT delta_link FROM delta_links WHERE drive_id = ? AND delta_name = ?",
+            (sharepoint_drive_id, delta_name),
+        ).fetchone()
+    return entry["delta_link"] if entry is not None else None
+
+
+def get_graph_delta_pages(delta_name: str, url: str) -> Iterator[List[dict]]:
+    """
+    Get changes from a Graph delta query as pages of items, starting from the last stored delta link if available
+
+    After each page is processed (i.e. when the next page is requested), the link to the next page, or the delta link
+    for the next sync once all pages are returned, is stored. Interrupted syncs therefore continue from the last page
+    processed, and later syncs only return changes since the last one completed.
+
+    If the stored link has expired (Graph returns 410 Gone), a `LookupError` is raised and the stored link removed.
+    """
+    delta_link = get_delta_link(delta_name=delta_name)
+    if delta_link is not None:
+        logging.info(f"Continuing '{delta_name}' delta query from stored link")
+        url = delta_link
+
+    while url is not None:
+        delta_page = get_graph_client().get(url=url)
+        if delta_page.status_code == HTTPStatus.GONE:
+            logging.warning(f"Stored link for '{delta_name}' delta query has expired, a full sync is required")
+            with open_state_db() as state_db:
+                state_db.execute(
+                    "DELETE FROM delta_links WHERE drive_id = ? AND delta_name = ?", (sharepoint_drive_id, delta_name)
+                )
+            raise LookupError(f"Stored link for '{delta_name}' delta query has expired")
+        delta_page.raise_for_status()
+        delta_page_data = delta_page.json()
+
+        yield delta_page_data["value"]
+
+        url = delta_page_data.get("@odata.nextLink")
+        with open_state_db() as state_db:
+            state_db.execute(
+                "INSERT OR REPLACE INTO delta_links VALUES (?, ?, ?)",
+                (sharepoint_drive_id, delta_name, url or delta_page_data["@odata.deltaLink"]),
+            )
+
+
+def apply_drive_delta_items(state_db: sqlite3.Connection, items: List[dict]) -> Dict[str, int]:
+    """
+    Apply a page of changes from a drive delta query to the local mirror of the drive
+
+    Deleted folders are removed along with anything within them, as Graph may not list each deleted child.
+    """
+    changes = {"changed": 0, "deleted": 0}
+    for item in items:
+        if "deleted" in item:
+            state_db.execute(
+                "WITH RECURSIVE deleted_items (item_id) AS (VALUES (?) UNION SELECT mirror_items.item_id "
+                "FROM mirror_items JOIN deleted_items ON mirror_items.parent_id = deleted_items.item_id "
+                "WHERE mirror_items.drive_id = ?) "
+                "DELETE FROM mirror_items WHERE drive_id = ? AND item_id IN (SELECT item_id FROM deleted_items)",
+                (item["id"], sharepoint_drive_id, sharepoint_drive_id),
+            )
+            state_db.execute(
+                "DELETE FROM sharing_links WHERE drive_id = ? AND item_id = ?", (sharepoint_drive_id, item["id"])
+            )
+            changes["deleted"] += 1
+            continue
+
+        # the root of the drive is the only item without a parent
+        parent_id = None if "root" in item else item.get("parentReference", {}).get("id")
+        state_db.execute(
+            "INSERT INTO mirror_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, NULL) "
+            "ON CONFLICT (drive_id, item_id) DO UPDATE SET parent_id = excluded.parent_id, "
+            "item_name = excluded.item_name, is_folder = excluded.is_folder, item_size = excluded.item_size, "
+            "quickxor_hash = excluded.quickxor_hash, web_url = excluded.web_url, list_item_id = excluded.list_item_id",
+            (
+                sharepoint_drive_id,
+                item["id"],
+                parent_id,
+                item["name"],
+                "folder" in item or "root" in item,
+                item.get("size"),
+                item.get("file", {}).get("hashes", {}).get("quickXorHash"),
+                item.get("webUrl"),
+                item.get("sharepointIds", {}).get("listItemId"),
+            ),
+        )
+        changes["changed"] += 1
+    return changes
+
+
+def apply_list_delta_items(state_db: sqlite3.Connection, items: List[dict]) -> int:
+    """
+    Apply a page of changes from a list items delta query to list fields in the local mirror of the drive
+
+    List items are matched to drive items by their list item ID. Deleted items are handled by the drive delta query.
+    """
+    fields_changed = 0
+    for item in items:
+        if "deleted" in item or "fields" not in item:
+            continue
+        fields_changed += state_db.execute(
+            "UPDATE mirror_items SET resource_id = ?, artefact_id = ? WHERE drive_id = ? AND list_item_id = ?",
+            (item["fields"].get("resource_id"), item["fields"].get("artefact_id"), sharepoint_drive_id, item["id"]),
+        ).rowcount
+    return fields_changed
+
+
+def index_mirror_items() -> None:
+    """
+    Replace the local item index with directories in the root of the drive, and files within them, from the mirror
+    """
+    with open_state_db() as state_db:
+        state_db.execute("DELETE FROM item_index WHERE drive_id = ?", (sharepoint_drive_id,))
+        state_db.execute(
+            "WITH root_items (item_id) AS (SELECT item_id FROM mirror_items WHERE drive_id = ? AND parent_id IS NULL) "
+            "INSERT INTO item_index SELECT items.drive_id, "
+            "CASE WHEN parents.parent_id IS NULL THEN 'root' ELSE items.parent_id END, "
+            "items.item_name, items.item_id, items.is_folder, items.item_size, items.quickxor_hash, ? "
+            "FROM mirror_items AS items JOIN mirror_items AS parents "
+            "ON parents.drive_id = items.drive_id AND parents.item_id = items.parent_id "
+            "WHERE items.drive_id = ? AND (parents.parent_id IS NULL OR parents.parent_id IN root_items) "
+            "AND (items.is_folder = 0 OR parents.parent_id IS NULL)",
+            (sharepoint_drive_id, time(), sharepoint_drive_id),
+        )
+
+
+def prune_sharing_links() -> None:
+    """
+    Remove stored sharing links for items no longer in the local mirror of the drive (e.g. deleted files)
+    """
+    with open_state_db() as state_db:
+        state_db.execute(
+            "DELETE FROM sharing_links WHERE drive_id = ? AND item_id NOT IN "
+            "(SELECT item_id FROM mirror_items WHERE drive_id = ?)",
+            (sharepoint_drive_id, sharepoint_drive_id),
+        )
+
+
+def set_mirror_item(
+    parent_id: str, item_data: dict, resource_id: Optional[str] = None, artefact_id: Optional[str] = None
+) -> None:
+    """
+    Add or update an item in the local mirror of the drive, from its drive item (e.g. as returned when created)
+
+    Used for changes made by this script, so they're available before the next sync.
+    """
+    with open_state_db() as state_db:
+        state_db.execute(
+            "INSERT OR REPLACE INTO mirror_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                sharepoint_drive_id,
+                item_data["id"],
+                parent_id,
+                item_data["name"],
+                "folder" in item_data,
+                item_data.get("size"),
+                item_data.get("file", {}).get("hashes", {}).get("quickXorHash"),
+                item_data.get("webUrl"),
+                item_data.get("sharepointIds", {}).get("listItemId"),
+                resource_id,
+                artefact_id,
+            ),
+        )
+
+
+def has_deposited_file_size(file_size: int) -> bool:
+    """
+    Check if any file already deposited in the drive has a given size, based on the local mirror of the drive
+
+    Used to avoid hashing files to find deposited files with the same contents (see `find_deposited_file()`), where
+    no deposited file could match.
+    """
+    with open_state_db() as state_db:
+        entry = state_db.execute(
+            "SELECT 1 FROM mirror_items WHERE drive_id = ? AND item_size = ? AND is_folder = 0 "
+            "AND artefact_id IS NOT NULL AND artefact_id != '-' LIMIT 1",
+            (sharepoint_drive_id, file_size),
+        ).fetchone()
+    return entry is not None
+
+
+def find_deposited_file(quickxor_hash: str, file_size: int) -> Optional[dict]:
+    """
+    Find a file already deposited in the drive with the same contents, based on its quickXorHash and size
+
+    Files are found from the local mirror of the drive, and must have been deposited as an artefact (i.e. have an
+    artefact ID). Mirrored items may be out of date, so callers should allow for found files no longer existing.
+    """
+    with open_state_db() as state_db:
+        entry = state_db.execute(
+            "SELECT * FROM mirror_items WHERE drive_id = ? AND quickxor_hash = ? AND item_size = ? AND is_folder = 0 "
+            "AND artefact_id IS NOT NULL AND artefact_id != '-' LIMIT 1",
+            (sharepoint_drive_id, quickxor_hash, file_size),
+        ).fetchone()
+    if entry is None:
+        return None
+    logging.debug(f"Found deposited file '{entry['item_id']}' matching hash '{quickxor_hash}'")
+    return dict(entry)
+
+
+def sync_sharepoint_drive(full: bool = False) -> Dict[str, int]:
+    """
+    Update the local mirror of the drive (folders, files, hashes and list fields) using Graph delta queries
+
+    Initially, and where `full` is set, all items in the drive are fetched. Subsequent syncs only fetch changes since
+    the last sync. The drive is synced first, as list fields are matched to drive items.
+
+    Once synced, the item index is rebuilt from the mirror (see `index_mirror_items()`).
+    """
+    from requests import HTTPError
+
+    summary = {"changed": 0, "deleted": 0, "fields_changed": 0}
+    delta_urls = {
+        "drive": f"/drives/{sharepoint_drive_id}/root/delta"
+        "?$select=id,name,size,file,folder,root,deleted,parentReference,webUrl,sharepointIds",
+        "list": f"/sites/{sharepoint_site_id}/lists/{sharepoint_list_id}/items/delta"
+        "?$expand=fields($select=resource_id,artefact_id)",
+    }
+
+    if full:
+        logging.info("Discarding local mirror for full sync")
+        with open_state_db() as state_db:
+            state_db.execute("DELETE FROM delta_links WHERE drive_id = ?", (sharepoint_drive_id,))
+            state_db.execute("DELETE FROM mirror_items WHERE drive_id = ?", (sharepoint_drive_id,))
+
+    try:
+        logging.info("Syncing drive items")
+        for delta_items in get_graph_delta_pages(delta_name="drive", url=delta_urls["drive"]):
+            with open_state_db() as state_db:
+                changes = apply_drive_delta_items(state_db=state_db, items=delta_items)
+            summary["changed"] += changes["changed"]
+            summary["deleted"] += changes["deleted"]
+            logging.info(f"Synced {summary['changed'] + summary['deleted']} drive item changes")
+
+        logging.info("Syncing list item fields")
+        for delta_items in get_graph_delta_pages(delta_name="list", url=delta_urls["list"]):
+            with open_state_db() as state_db:
+                summary["fields_changed"] += apply_list_delta_items(state_db=state_db, items=delta_items)
+            logging.info(f"Synced {summary['fields_changed']} list item field changes")
+    except LookupError as e:
+        if full:
+            logging.error("Cannot sync SharePoint drive")
+            raise RuntimeError("Cannot sync SharePoint drive") from e
+        return sync_sharepoint_drive(full=True)
+    except HTTPError as e:
+        logging.error("Cannot sync SharePoint drive")
+        raise RuntimeError("Cannot sync SharePoint drive") from e
+
+    index_mirror_items()
+    prune_sharing_links()
+    return summary
+
+
+def get_sharepoint_directory(
+    directory_name: Optional[str] = None, directory_id: Optional[str] = None, use_index: bool = True
+) -> dict:
+    """
+    Get a directory in the root of the drive by name or ID
+
+    Directories looked up by name are taken from the local item index if possible (unless `use_index` is False), which
+    only includes a subset of properties (see `get_indexed_item()`). Otherwise, directories found are indexed.
+    """
     logging.debug(f"directory name: '{directory_name}'")
     logging.debug(f"directory id: '{directory_id}'")
 
     if directory_name is not None and directory_id is not None:
         raise RuntimeError("Only one of 'directory_name' or 'directory_id' can be specified")
     if directory_name is not None:
-        url = f"https://graph.microsoft.com/v1.0/drives/{sharepoint_drive_id}/root:/{directory_name}"
+        url = f"/drives/{sharepoint_drive_id}/root:/{directory_name}"
+        if use_index:
+            directory_item_data = get_indexed_item(parent_id="root", item_name=directory_name)
+            if directory_item_data is not None:
+                return directory_item_data
     if directory_id is not None:
-        url = f"https://graph.microsoft.com/v1.0/drives/{sharepoint_drive_id}/items/{directory_id}"
-
-    auth_token = get_auth_token()
+        url = f"/drives/{sharepoint_drive_id}/items/{directory_id}"
 
     # noinspection PyUnboundLocalVariable
-    directory_item = requests.get(url=url, headers={"Authorization": f"Bearer {auth_token}"})
+    directory_item = get_graph_client().get(url=url)
     directory_item.raise_for_status()
-    return directory_item.json()
+    directory_item_data = directory_item.json()
+    if directory_name is not None:
+        set_indexed_item(parent_id="root", item_data=directory_item_data)
+    return directory_item_data
 
 
-def get_sharepoint_file(directory_id: str, file_name: Optional[str] = None, file_id: Optional[str] = None) -> dict:
+def get_sharepoint_file(
+    directory_id: str, file_name: Optional[str] = None, file_id: Optional[str] = None, use_index: bool = True
+) -> dict:
+    """
+    Get a file within a directory by name or ID
+
+    Files looked up by name are taken from the local item index if possible (unless `use_index` is False), which only
+    includes a subset of properties (see `get_indexed_item()`). Otherwise, files found are added to the index.
+    """
     logging.debug(f"directory id: '{directory_id}'")
     logging.debug(f"file name: '{file_name}'")
     logging.debug(f"file id: '{file_id}'")
@@ -198,86 +1405,195 @@ def get_sharepoint_file(directory_id: str, file_name: Optional[str] = None, file
     if file_name is not None and file_id is not None:
         raise RuntimeError("Only one of 'directory_name' or 'directory_id' can be specified")
     if file_name is not None:
-        url = f"https://graph.microsoft.com/v1.0/drives/{sharepoint_drive_id}/items/{directory_id}:/{file_name}:"
+        url = f"/drives/{sharepoint_drive_id}/items/{directory_id}:/{file_name}:"
+        if use_index:
+            file_item_data = get_indexed_item(parent_id=directory_id, item_name=file_name)
+            if file_item_data is not None:
+                return file_item_data
     if file_id is not None:
-        url = f"https://graph.microsoft.com/v1.0/drives/{sharepoint_drive_id}/items/{file_id}"
-
-    auth_token = get_auth_token()
+        url = f"/drives/{sharepoint_drive_id}/items/{file_id}"
 
     # noinspection PyUnboundLocalVariable
-    directory_item = requests.get(url=url, headers={"Authorization": f"Bearer {auth_token}"})
+    directory_item = get_graph_client().get(url=url)
     directory_item.raise_for_status()
-    return directory_item.json()
+    file_item_data = directory_item.json()
+    set_indexed_item(parent_id=directory_id, item_data=file_item_data)
+    return file_item_data
 
 
-def set_sharepoint_directory_metadata(directory_id: str, directory_metadata: Dict[str, str]) -> None:
+def set_sharepoint_directory_metadata(
+    directory_id: str, directory_metadata: Dict[str, str], batch: Optional[GraphBatch] = None
+) -> Optional[str]:
+    """
+    Set list item fields for a directory
+
+    If `batch` is set, the request is added to the batch and its ID returned, rather than being sent.
+    """
     logging.debug(f"directory id: '{directory_id}'")
     logging.debug("Directory metadata:")
     logging.debug(directory_metadata)
 
-    auth_token = get_auth_token()
+    return set_sharepoint_item_fields(item_id=directory_id, fields=directory_metadata, batch=batch)
 
-    directory_list_item = requests.get(
-        url=f"https://graph.microsoft.com/v1.0/drives/{sharepoint_drive_id}/items/{directory_id}/listitem",
-        headers={"Authorization": f"Bearer {auth_token}"},
-    )
-    directory_list_item.raise_for_status()
-    directory_list_item_data = directory_list_item.json()
-
-    directory_list_item_fields = requests.patch(
-        url=f"https://graph.microsoft.com/v1.0/sites/{sharepoint_site_id}/lists/{sharepoint_list_id}/items/{directory_list_item_data['id']}/fields",
-        headers={"Authorization": f"Bearer {auth_token}"},
-        json=directory_metadata,
-    )
-    directory_list_item_fields.raise_for_status()
 
+def set_sharepoint_file_metadata(
+    file_id: str, file_metadata: Dict[str, str], batch: Optional[GraphBatch] = None
+) -> Optional[str]:
+    """
+    Set list item fields for a file
 
-def set_sharepoint_file_metadata(file_id: str, file_metadata: Dict[str, str]) -> None:
+    If `batch` is set, the request is added to the batch and its ID returned, rather than being sent.
+    """
     logging.debug(f"file id: '{file_id}'")
     logging.debug("File metadata:")
     logging.debug(file_metadata)
 
-    auth_token = get_auth_token()
+    return set_sharepoint_item_fields(item_id=file_id, fields=file_metadata, batch=batch)
 
-    file_list_item = requests.get(
-        url=f"https://graph.microsoft.com/v1.0/drives/{sharepoint_drive_id}/items/{file_id}/listitem",
-        headers={"Authorization": f"Bearer {auth_token}"},
-    )
-    file_list_item.raise_for_status()
-    file_list_item_data = file_list_item.json()
 
-    file_list_item_fields = requests.patch(
-        url=f"https://graph.microsoft.com/v1.0/sites/{sharepoint_site_id}/lists/{sharepoint_list_id}/items/{file_list_item_data['id']}/fields",
-        headers={"Authorization": f"Bearer {auth_token}"},
-        json=file_metadata,
-    )
-    file_list_item_fields.raise_for_status()
+def set_sharepoint_item_fields(
+    item_id: str, fields: Dict[str, str], batch: Optional[GraphBatch] = None
+) -> Optional[str]:
+    # fields are set via the drive item, which avoids looking up the list item ID for the drive item first
+    url = f"/drives/{sharepoint_drive_id}/items/{item_id}/listItem/fields"
+    if batch is not None:
+        return batch.add(method="PATCH", url=url, json=fields)
+
+    item_fields = get_graph_client().patch(url=url, json=fields)
+    item_fields.raise_for_status()
+    return None
+
+
+def invite_sharepoint_recipients(
+    item_id: str, object_ids: List[str], roles: Optional[List[str]] = None, batch: Optional[GraphBatch] = None
+) -> Optional[str]:
+    """
+    Grant users or groups (by Azure object ID) access to an item, in a single invite request
+
+    If `batch` is set, the request is added to the batch and its ID returned, rather than being sent.
+    """
+    if roles is None:
+        roles = ["read"]
+
+    logging.debug("Preparing recipients")
+    recipients = []
+    for object_id in object_ids:
+        recipients.append({"objectID": object_id})
+    logging.debug("Prepared recipients:")
+    logging.debug(recipients)
+
+    url = f"/drives/{sharepoint_drive_id}/items/{item_id}/invite"
+    invite = {"requireSignIn": True, "sendInvitation": False, "roles": roles, "recipients": recipients}
+    if batch is not None:
+        return batch.add(method="POST", url=url, json=invite)
+
+    # granting the same access again has no effect, so repeating this is safe
+    invite_request = get_graph_client().post(url=url, json=invite, idempotent=True)
+    invite_request.raise_for_status()
+    return None
+
+
+def get_sharepoint_item_permissions(item_id: str) -> List[dict]:
+    permissions = []
+    url: Optional[str] = f"/drives/{sharepoint_drive_id}/items/{item_id}/permissions"
+    while url is not None:
+        permissions_page = get_graph_client().get(url=url)
+        permissions_page.raise_for_status()
+        permissions_page_data = permissions_page.json()
+        permissions.extend(permissions_page_data["value"])
+        url = permissions_page_data.get("@odata.nextLink")
+    return permissions
+
+
+def index_sharepoint_permissions(permissions: List[dict]) -> Dict[str, Dict[str, Set[str]]]:
+    """
+    Index permissions for an item by grantee (Azure object ID), then kind of grantee (e.g. 'user' or 'group')
+
+    Returns the roles (e.g. 'read') granted to each grantee and kind, combined across all permissions for the item
+    (including inherited permissions and each identity a sharing link is granted to).
+    """
+    permissions_index: Dict[str, Dict[str, Set[str]]] = {}
+    for permission in permissions:
+        grantees = [permission.get("grantedToV2", {})] + permission.get("grantedToIdentitiesV2", [])
+        for grantee in grantees:
+            for grantee_kind in ["user", "group"]:
+                if grantee_kind not in grantee or "id" not in grantee[grantee_kind]:
+                    continue
+                grantee_roles = permissions_index.setdefault(grantee[grantee_kind]["id"], {}).setdefault(
+                    grantee_kind, set()
+                )
+                grantee_roles.update(permission.get("roles", []))
+    return permissions_index
+
+
+def reconcile_sharepoint_permissions(item_id: str, object_ids: List[str], role: str = "read") -> Dict[str, int]:
+    """
+    Grant users or groups (by Azure object ID) access to an item where they don't already have it
+
+    Existing permissions are fetched once and indexed by grantee (see `index_sharepoint_permissions()`), with any
+    missing grants applied in a single invite. Grantees with a higher role (e.g. 'write' where 'read' is needed)
+    are considered to already have access.
+
+    Returns the number of grantees that already had access, and that were granted it.
+    """
+    from requests import HTTPError
+
+    satisfying_roles = {"read": {"read", "write", "owner"}, "write": {"write", "owner"}, "owner": {"owner"}}[role]
+
+    try:
+        permissions_index = index_sharepoint_permissions(permissions=get_sharepoint_item_permissions(item_id=item_id))
+    except HTTPError as e:
+        logging.error("Cannot get SharePoint item permissions")
+        raise RuntimeError("Cannot get SharePoint item permissions") from e
+
+    missing_object_ids = []
+    for object_id in object_ids:
+        grantee_roles: Set[str] = set().union(*permissions_index.get(object_id, {}).values())
+        if grantee_roles.isdisjoint(satisfying_roles):
+            missing_object_ids.append(object_id)
+    logging.debug(f"Missing grantees: {missing_object_ids}")
+
+    if len(missing_object_ids) > 0:
+        try:
+            invite_sharepoint_recipients(item_id=item_id, object_ids=missing_object_ids, roles=[role])
+        except HTTPError as e:
+            logging.error("Cannot set SharePoint item permissions")
+            raise RuntimeError("Cannot set SharePoint item permissions") from e
+
+    return {"existing": len(object_ids) - len(missing_object_ids), "granted": len(missing_object_ids)}
 
 
 def create_sharepoint_directory(
     directory_name: str, directory_metadata: Dict[str, str], sharing_recipients: Optional[List[str]] = None
 ) -> None:
+    from requests import HTTPError
+
     logging.debug(f"Directory name: '{directory_name}'")
     logging.debug("Directory metadata:")
     logging.debug(directory_metadata)
     logging.debug(f"Sharing Recipients:")
     logging.debug(sharing_recipients)
 
+    directory_item_data: Optional[dict] = None
     try:
         logging.info("Checking if directory already exists")
-        get_sharepoint_directory(directory_name=directory_name)
-        return None
+        directory_item_data = get_sharepoint_directory(directory_name=directory_name)
     except HTTPError as e:
-        if e.response.status_code != http.client.NOT_FOUND:
+        if e.response.status_code != HTTPStatus.NOT_FOUND:
             logging.error("Cannot determine if SharePoint directory exists")
             raise RuntimeError("Cannot determine if SharePoint directory exists") from e
 
+    if directory_item_data is not None:
+        # permissions in the record may have changed since the directory was created
+        if sharing_recipients is not None:
+            logging.info("Reconciling directory permissions")
+            reconcile_sharepoint_permissions(item_id=directory_item_data["id"], object_ids=sharing_recipients)
+        return None
+
     try:
         logging.info("Creating directory")
-        auth_token = get_auth_token()
-        create_directory_item = requests.post(
-            url=f"https://graph.microsoft.com/v1.0/drives/{sharepoint_drive_id}/root/children",
-            headers={"Authorization": f"Bearer {auth_token}"},
+        create_directory_item = get_graph_client().post(
+            url=f"/drives/{sharepoint_drive_id}/root/children",
             json={
                 "name": directory_name,
                 "folder": {},
@@ -286,145 +1602,739 @@ def create_sharepoint_directory(
         )
         create_directory_item.raise_for_status()
         create_directory_item_data = create_directory_item.json()
+        set_indexed_item(parent_id="root", item_data=create_directory_item_data)
     except HTTPError as e:
         logging.error("Cannot create SharePoint directory")
         raise RuntimeError("Cannot create SharePoint directory") from e
 
-    try:
-        logging.info("Setting directory metadata")
-        set_sharepoint_directory_metadata(
-            directory_id=create_directory_item_data["id"], directory_metadata=directory_metadata
+    # metadata and permissions are independent, so are set together
+    directory_batch = GraphBatch(client=get_graph_client())
+
+    logging.info("Setting directory metadata")
+    set_directory_metadata_id = set_sharepoint_directory_metadata(
+        directory_id=create_directory_item_data["id"], directory_metadata=directory_metadata, batch=directory_batch
+    )
+
+    set_directory_permissions_id: Optional[str] = None
+    if sharing_recipients is not None:
+        logging.info("Setting directory permissions")
+
+        # a new directory has no permissions of its own yet, so there's nothing to reconcile against
+        set_directory_permissions_id = invite_sharepoint_recipients(
+            item_id=create_directory_item_data["id"], object_ids=sharing_recipients, batch=directory_batch
         )
+
+    try:
+        directory_responses = directory_batch.send()
+        directory_responses[set_directory_metadata_id].raise_for_status()
     except HTTPError as e:
         logging.error("Cannot set SharePoint directory metadata")
         raise RuntimeError("Cannot set SharePoint directory metadata") from e
+    if set_directory_permissions_id is not None:
+        try:
+            directory_responses[set_directory_permissions_id].raise_for_status()
+        except HTTPError as e:
+            logging.error("Cannot set SharePoint directory permissions")
+            raise RuntimeError("Cannot set SharePoint directory permissions") from e
+
+
+def upload_sharepoint_session_chunk(
+    upload_url: str, chunk_data: Union[bytes, memoryview], range_start: int, file_size: int
+) -> dict:
+    range_end = range_start + len(chunk_data)
+    logging.debug(f"Uploading chunk: 'bytes {range_start}-{range_end - 1}/{file_size}'")
+
+    # upload URLs are pre-authenticated, Graph may reject chunks that include an authorisation header
+    chunk_upload = get_graph_client().put(
+        url=upload_url,
+        authenticate=False,
+        data=chunk_data,
+        headers={
+            "Content-Length": str(len(chunk_data)),
+            "Content-Range": f"bytes {range_start}-{range_end - 1}/{file_size}",
+        },
+    )
+    chunk_upload.raise_for_status()
+    return {"status_code": chunk_upload.status_code, "data": chunk_upload.json()}
 
-    if sharing_recipients is not None:
-        logging.info("Setting directory permissions")
 
-        logging.debug("Preparing recipients")
-        _sharing_recipients = []
-        for sharing_recipient in sharing_recipients:
-            _sharing_recipients.append({"objectID": sharing_recipient})
-        logging.debug("Prepared recipients:")
-        logging.debug(_sharing_recipients)
+def parse_upload_session_ranges(ranges: List[str], file_size: int) -> List[Tuple[int, int]]:
+    """
+    Convert upload session byte ranges (e.g. '0-511', '512-') into (start, end) tuples, where end is exclusive.
 
-        set_directory_permissions = requests.post(
-            url=f"https://graph.microsoft.com/v1.0/drives/{sharepoint_drive_id}/items/{create_directory_item_data['id']}/invite",
-            headers={"Authorization": f"Bearer {auth_token}"},
-            json={
-                "requireSignIn": True,
-                "sendInvitation": False,
-                "roles": ["read"],
-                "recipients": _sharing_recipients,
-            },
+    Ranges without an end run to the end of the file.
+    """
+    _ranges = []
+    for _range in ranges:
+        range_start, range_end = _range.split("-")
+        _ranges.append((int(range_start), int(range_end) + 1 if range_end != "" else file_size))
+    return sorted(_ranges)
+
+
+class UploadChunkSizer:
+    """
+    Chooses sizes for chunks uploaded to upload sessions, from measured throughput and errors
+
+    Chunks are sized to take around `target_duration` seconds to upload at the throughput measured for recent chunks,
+    so faster connections use fewer, larger, chunks (and so fewer requests), and slower connections use smaller chunks
+    (so less needs uploading again if a chunk fails). Sizes at most double from one chunk to the next, and halve for
+    each failed chunk.
+
+    Sizes are always a multiple of `upload_chunk_size`, up to `upload_chunk_max_size`, as required by Graph.
+    """
+
+    def __init__(self, initial_size: Optional[int] = None, target_duration: Optional[float] = None):
+        if initial_size is None:
+            initial_size = upload_chunk_initial_size
+        if target_duration is None:
+            target_duration = upload_chunk_target_duration
+        self.target_duration = target_duration
+        self.size = self._clamp(initial_size)
+        self._throughput: Optional[float] = None
+
+    @staticmethod
+    def _clamp(size: float) -> int:
+        return int(min(max(size // upload_chunk_size, 1) * upload_chunk_size, upload_chunk_max_size))
+
+    def record_success(self, chunk_size: int, duration: float) -> None:
+        # smoothed, as the throughput of individual chunks varies
+        throughput = chunk_size / max(duration, 1e-6)
+        self._throughput = throughput if self._throughput is None else (self._throughput + throughput) / 2
+        self.size = self._clamp(min(self._throughput * self.target_duration, self.size * 2))
+
+    def record_error(self) -> None:
+        self.size = self._clamp(self.size / 2)
+
+
+def upload_sharepoint_session_file(
+    upload_url: str,
+    file_path: Path,
+    ranges: Optional[List[Tuple[int, int]]] = None,
+    progress_callback: Optional[Callable[[List[str]], None]] = None,
+    quickxor_hash: Optional[str] = None,
+    chunk_sizer: Optional[UploadChunkSizer] = None,
+) -> dict:
+    """
+    Upload the contents of a file to a Graph upload session
+
+    The file is read in order as a series of chunks, each a multiple of 320 KiB (except the last) as required by Graph.
+    Chunks are slices of a memory mapped view of the file (see `map_file()`), so uploads don't hold copies of the file
+    in memory, with pages for each chunk released once uploaded.
+
+    Upload sessions require byte ranges to be uploaded in order, so chunks are uploaded one at a time, with a failed
+    chunk uploaded again before any later chunks. Files are instead uploaded in parallel with each other (see
+    `deposit_resource_artefacts_concurrently()`). The drive item for the completed file is returned by the last chunk.
+
+    Chunk sizes are chosen as the upload progresses, based on the throughput of previous chunks (see
+    `UploadChunkSizer`). Chunks that fail (after any retries, see `GraphClient.request()`) due to connection or server
+    errors are uploaded again, in smaller chunks, up to `upload_chunk_max_errors` times.
+
+    By default, the whole file is uploaded. When resuming an upload session, `ranges` limits uploads to the byte ranges
+    the session is still expecting (see `parse_upload_session_ranges()`). If set, `progress_callback` is called with the
+    ranges the session expects next, as reported by each uploaded chunk.
+
+    The quickXorHash of the file is calculated from the same reads used for uploading, so the file is only read once.
+    Chunks that don't need uploading (when resuming) are still read to calculate the hash, unless the hash is already
+    known (e.g. from the hash cache) and given as `quickxor_hash`.
+
+    Returns the completed drive item, the local quickXorHash of the file and metrics for the upload (size, chunk
+    sizes, duration and throughput).
+    """
+    import quickxorhash
+    import requests
+    from requests import HTTPError
+
+    if chunk_sizer is None:
+        chunk_sizer = UploadChunkSizer()
+
+    file_size = file_path.stat().st_size
+    logging.debug(f"File size: {file_size}")
+    if file_size == 0:
+        logging.error("Empty files cannot be uploaded to an upload session")
+        raise RuntimeError("Empty files cannot be uploaded to an upload session")
+
+    if ranges is None:
+        ranges = [(0, file_size)]
+    logging.debug(f"Upload ranges: {ranges}")
+    if sum(range_end - range_start for range_start, range_end in ranges) == 0:
+        logging.error("No byte ranges to upload to upload session")
+        raise RuntimeError("No byte ranges to upload to upload session")
+
+    def _get_chunks() -> Iterator[Tuple[int, int, bool]]:
+        # unless its hash is known, the whole file is read (in order) to hash it, but only chunks in `ranges` are
+        # uploaded, sized when needed so each chunk uses the latest size
+        _range_position = 0
+        for _range_start, _range_end in ranges + [(file_size, file_size)]:
+            if quickxor_hash is not None:
+                _range_position = _range_start
+            for _chunk_start in range(_range_position, _range_start, upload_chunk_initial_size):
+                yield _chunk_start, min(_chunk_start + upload_chunk_initial_size, _range_start), False
+            _chunk_start = _range_start
+            while _chunk_start < _range_end:
+                _chunk_end = min(_chunk_start + chunk_sizer.size, _range_end)
+                yield _chunk_start, _chunk_end, True
+                _chunk_start = _chunk_end
+            _range_position = _range_end
+
+    quickxor = quickxorhash.quickxorhash()
+    upload_item_data: Optional[dict] = None
+    upload_size = 0
+    chunk_sizes: List[int] = []
+    chunk_errors = 0
+    started_at = monotonic()
+
+    def _upload_range(_range_start: int, _range_end: int) -> None:
+        # a failed chunk is uploaded again (split if chunk sizes have since reduced) before moving on
+        nonlocal upload_item_data, upload_size, chunk_errors
+        _chunk_start = _range_start
+        while _chunk_start < _range_end:
+            _chunk_end = min(_chunk_start + chunk_sizer.size, _range_end)
+            _started_at = monotonic()
+            try:
+                chunk_upload_data = upload_sharepoint_session_chunk(
+                    upload_url=upload_url,
+                    chunk_data=file_view[_chunk_start:_chunk_end],
+                    range_start=_chunk_start,
+                    file_size=file_size,
+                )
+            except (HTTPError, requests.ConnectionError, requests.Timeout) as e:
+                # client errors (e.g. an expired session) won't be fixed by uploading again
+                if isinstance(e, HTTPError) and e.response.status_code < HTTPStatus.INTERNAL_SERVER_ERROR:
+                    raise
+                chunk_errors += 1
+                if chunk_errors > upload_chunk_max_errors:
+                    raise
+                chunk_sizer.record_error()
+                logging.warning(
+                    f"Cannot upload chunk 'bytes {_chunk_start}-{_chunk_end - 1}' ({e}), uploading again "
+                    f"[{chunk_errors}/{upload_chunk_max_errors}]"
+                )
+                continue
+
+            chunk_sizer.record_success(chunk_size=_chunk_end - _chunk_start, duration=monotonic() - _started_at)
+            chunk_sizes.append(_chunk_end - _chunk_start)
+            upload_size += _chunk_end - _chunk_start
+            if chunk_upload_data["status_code"] in [HTTPStatus.OK, HTTPStatus.CREATED]:
+                upload_item_data = chunk_upload_data["data"]
+            elif progress_callback is not None:
+                progress_callback(chunk_upload_data["data"].get("nextExpectedRanges", []))
+            _chunk_start = _chunk_end
+
+    with map_file(file_path=file_path) as file_view:
+        for chunk_start, chunk_end, chunk_upload_required in _get_chunks():
+            if quickxor_hash is None:
+                # the quickxorhash module only accepts bytes, so hashing needs a short-lived copy of chunks
+                quickxor.update(file_view[chunk_start:chunk_end].tobytes())
+            if chunk_upload_required:
+                _upload_range(_range_start=chunk_start, _range_end=chunk_end)
+            release_file_chunk(file_view=file_view, chunk_start=chunk_start, chunk_end=chunk_end)
+    duration = max(monotonic() - started_at, 1e-6)
+
+    if upload_item_data is None:
+        logging.error("Upload session did not return a drive item once all chunks were uploaded")
+        raise RuntimeError("Upload session did not return a drive item once all chunks were uploaded")
+
+    metrics = {
+        "file_size": file_size,
+        "upload_size": upload_size,
+        "chunks_count": len(chunk_sizes),
+        "chunk_sizes": {
+            "first": chunk_sizes[0],
+            "min": min(chunk_sizes),
+            "max": max(chunk_sizes),
+            # size chosen for the next chunk, had there been one
+            "final": chunk_sizer.size,
+        },
+        "chunk_errors": chunk_errors,
+        "duration": round(duration, 3),
+        "throughput": round(upload_size / duration),
+    }
+    logging.info(
+        f"Uploaded '{file_path.name}' ({upload_size} of {file_size} bytes in {len(chunk_sizes)} chunks of up to "
+        f"{metrics['chunk_sizes']['max']} bytes) in {metrics['duration']}s ({metrics['throughput'] / 2**20:.2f} MiB/s)"
+    )
+    if quickxor_hash is None:
+        quickxor_hash = encode_quickxor_hash(quickxor)
+    return {"item": upload_item_data, "quickxor_hash": quickxor_hash, "metrics": metrics}
+
+
+def get_upload_journal_entry(directory_id: str, file_name: str) -> Optional[dict]:
+    with open_state_db() as state_db:
+        entry = state_db.execute(
+            "SELECT * FROM upload_journal WHERE drive_id = ? AND directory_id = ? AND file_name = ?",
+            (sharepoint_drive_id, directory_id, file_name),
+        ).fetchone()
+    if entry is None:
+        return None
+    entry = dict(entry)
+    entry["next_expected_ranges"] = json.loads(entry["next_expected_ranges"])
+    return entry
+
+
+def set_upload_journal_entry(
+    directory_id: str, file_path: Path, upload_url: str, next_expected_ranges: List[str]
+) -> None:
+    file_stat = file_path.stat()
+    with open_state_db() as state_db:
+        state_db.execute(
+            "INSERT OR REPLACE INTO upload_journal VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                sharepoint_drive_id,
+                directory_id,
+                file_path.name,
+                str(file_path.resolve()),
+                file_stat.st_size,
+                file_stat.st_mtime_ns,
+                upload_url,
+                json.dumps(next_expected_ranges),
+            ),
+        )
+
+
+def update_upload_journal_entry(directory_id: str, file_name: str, next_expected_ranges: List[str]) -> None:
+    with open_state_db() as state_db:
+        state_db.execute(
+            "UPDATE upload_journal SET next_expected_ranges = ? "
+            "WHERE drive_id = ? AND directory_id = ? AND file_name = ?",
+            (json.dumps(next_expected_ranges), sharepoint_drive_id, directory_id, file_name),
+        )
+
+
+def delete_upload_journal_entry(directory_id: str, file_name: str) -> None:
+    with open_state_db() as state_db:
+        state_db.execute(
+            "DELETE FROM upload_journal WHERE drive_id = ? AND directory_id = ? AND file_name = ?",
+            (sharepoint_drive_id, directory_id, file_name),
         )
-        set_directory_permissions.raise_for_status()
+
+
+def resume_sharepoint_upload_session(directory_id: str, file_path: Path) -> Optional[dict]:
+    """
+    Get an upload session for a file from a previous, interrupted, upload if possible
+
+    Sessions are resumed where the file to upload is unchanged (based on its path, size and modification time) and the
+    session hasn't expired. Otherwise any journal entry for the file is removed, and any session cancelled.
+
+    Returns the upload URL and the byte ranges still to be uploaded, or None if there's no session to resume.
+    """
+    journal_entry = get_upload_journal_entry(directory_id=directory_id, file_name=file_path.name)
+    if journal_entry is None:
+        return None
+    logging.debug("Upload journal entry:")
+    logging.debug(journal_entry)
+
+    file_stat = file_path.stat()
+    if (
+        journal_entry["file_path"] != str(file_path.resolve())
+        or journal_entry["file_size"] != file_stat.st_size
+        or journal_entry["file_mtime_ns"] != file_stat.st_mtime_ns
+    ):
+        logging.info("File changed since previous upload session, discarding session")
+        delete_upload_journal_entry(directory_id=directory_id, file_name=file_path.name)
+        # best effort, the session will expire anyway
+        get_graph_client().delete(url=journal_entry["upload_url"], authenticate=False)
+        return None
+
+    upload_session_status = get_graph_client().get(url=journal_entry["upload_url"], authenticate=False)
+    if upload_session_status.status_code == HTTPStatus.NOT_FOUND:
+        logging.info("Previous upload session expired, discarding session")
+        delete_upload_journal_entry(directory_id=directory_id, file_name=file_path.name)
+        return None
+    upload_session_status.raise_for_status()
+    next_expected_ranges: List[str] = upload_session_status.json()["nextExpectedRanges"]
+    logging.info(f"Resuming previous upload session, expected ranges: {next_expected_ranges}")
+    update_upload_journal_entry(
+        directory_id=directory_id, file_name=file_path.name, next_expected_ranges=next_expected_ranges
+    )
+
+    return {
+        "upload_url": journal_entry["upload_url"],
+        "ranges": parse_upload_session_ranges(ranges=next_expected_ranges, file_size=file_stat.st_size),
+    }
 
 
 def upload_sharepoint_file(
     file_path: Path, file_metadata: Dict[str, str], directory_id: str, sharing_link: bool = False
-) -> Dict[str, str]:
+) -> dict:
+    from requests import HTTPError
+
     logging.debug(f"File path: '{file_path}'")
     logging.debug(f"File metadata:")
     logging.debug(file_metadata)
     logging.debug(f"Directory ID: '{directory_id}'")
     logging.debug(f"Sharing link: '{sharing_link}'")
 
+    # small files are uploaded with 'conflictBehavior=fail', so an existing file fails the upload without checking first
+    if file_path.stat().st_size <= upload_simple_max_size:
+        return upload_sharepoint_small_file(
+            file_path=file_path, file_metadata=file_metadata, directory_id=directory_id, sharing_link=sharing_link
+        )
+
     try:
         logging.info("Checking if file already exists")
         get_sharepoint_file(directory_id=directory_id, file_name=file_path.name)
     except HTTPError as e:
-        if e.response.status_code != http.client.NOT_FOUND:
+        if e.response.status_code != HTTPStatus.NOT_FOUND:
             logging.error("Cannot determine if SharePoint file exists")
             raise RuntimeError("Cannot determine if SharePoint file exists") from e
 
+    # taken before uploading, so the hash cache isn't updated if the file changes whilst uploading
+    file_stat = file_path.stat()
+    cached_hashes = get_cached_file_hashes(file_path=file_path)
+
     try:
         logging.info("uploading file")
-        auth_token = get_auth_token()
+        upload_session_data = resume_sharepoint_upload_session(directory_id=directory_id, file_path=file_path)
+        if upload_session_data is None:
+            # https://stackoverflow.com/a/60467652
+            # the file is only created once fully uploaded, so repeating this only creates an unused session
+            upload_session = get_graph_client().post(
+                url=f"/drives/{sharepoint_drive_id}/items/{directory_id}:/{file_path.name}:/createUploadSession",
+                json={"@microsoft.graph.conflictBehavior": "fail"},
+                idempotent=True,
+            )
+            upload_session.raise_for_status()
+            upload_session_data = {"upload_url": upload_session.json()["uploadUrl"], "ranges": None}
+            set_upload_journal_entry(
+                directory_id=directory_id,
+                file_path=file_path,
+                upload_url=upload_session_data["upload_url"],
+                next_expected_ranges=["0-"],
+            )
+
+        upload_data = upload_sharepoint_session_file(
+            upload_url=upload_session_data["upload_url"],
+            file_path=file_path,
+            ranges=upload_session_data["ranges"],
+            progress_callback=lambda next_expected_ranges: update_upload_journal_entry(
+                directory_id=directory_id, file_name=file_path.name, next_expected_ranges=next_expected_ranges
+            ),
+            quickxor_hash=cached_hashes["quickxor_hash"] if cached_hashes is not None else None,
+        )
+        upload_item_data: dict = upload_data["item"]
+        delete_upload_journal_entry(directory_id=directory_id, file_name=file_path.name)
+        set_indexed_item(parent_id=directory_id, item_data=upload_item_data)
+    except HTTPError as e:
+        logging.error("Cannot upload SharePoint file")
+        raise RuntimeError("Cannot upload SharePoint file") from e
 
-        # https://stackoverflow.com/a/60467652
-        upload_session = requests.post(
-            url=f"https://graph.microsoft.com/v1.0/drives/{sharepoint_drive_id}/items/{directory_id}:/{file_path.name}:/createUploadSession",
-            headers={"Authorization": f"Bearer {auth_token}"},
-            json={"@microsoft.graph.conflictBehavior": "fail"},
+    # verify hash
+    if upload_item_data["file"]["hashes"]["quickXorHash"] != upload_data["quickxor_hash"]:
+        raise RuntimeError("Hash for uploaded file does not match file artefact")
+    if cached_hashes is None:
+        set_cached_file_hashes(file_path=file_path, file_stat=file_stat, quickxor_hash=upload_data["quickxor_hash"])
+
+    file_uri = set_sharepoint_file_properties(
+        file_item_data=upload_item_data,
+        directory_id=directory_id,
+        file_metadata=file_metadata,
+        sharing_link=sharing_link,
+    )
+    return {"file_uri": file_uri, "upload_metrics": upload_data["metrics"]}
+
+
+def get_stored_sharing_link(item_id: str) -> Optional[str]:
+    with open_state_db() as state_db:
+        entry = state_db.execute(
+            "SELECT link_url FROM sharing_links WHERE drive_id = ? AND item_id = ?", (sharepoint_drive_id, item_id)
+        ).fetchone()
+    return entry["link_url"] if entry is not None else None
+
+
+def set_stored_sharing_link(item_id: str, link_url: str) -> None:
+    with open_state_db() as state_db:
+        state_db.execute(
+            "INSERT OR REPLACE INTO sharing_links VALUES (?, ?, ?)", (sharepoint_drive_id, item_id, link_url)
         )
-        upload_session.raise_for_status()
-        upload_session_data = upload_session.json()
 
-        with open(file_path, "rb") as src_file:
-            total_file_size = file_path.stat().st_size
-            chunk_size = 327680  # set by Microsoft (≈4kB)
-            chunks_count = total_file_size // chunk_size
-            chunks_leftover = total_file_size - (chunk_size * chunks_count)
 
-            # ensure there's at least one chunk for files under 320kB
-            if chunks_count == 0:
-                chunks_count = 1
+def get_sharing_links(item_ids: List[str]) -> Dict[str, str]:
+    """
+    Get organisation sharing links for many items, creating any that don't exist
+
+    Links are taken from the local sharing link store where possible. Other links are created together (using as few
+    batches as possible), which returns the existing link for items that already have one, and stored.
+    """
+    from requests import HTTPError
+
+    sharing_links: Dict[str, str] = {}
+    links_batch = GraphBatch(client=get_graph_client())
+    share_link_ids: Dict[str, str] = {}
+    for item_id in item_ids:
+        link_url = get_stored_sharing_link(item_id=item_id)
+        if link_url is not None:
+            sharing_links[item_id] = link_url
+            continue
+        share_link_ids[item_id] = links_batch.add(
+            method="POST",
+            url=f"/drives/{sharepoint_drive_id}/items/{item_id}/createLink",
+            json={"type": "view", "scope": "organization"},
+        )
+    logging.info(f"Using {len(sharing_links)} stored sharing links, creating {len(share_link_ids)}")
 
-            for chunk_index in range(0, chunks_count + 1):
-                print(f"Processing chunk [{chunk_index}/{chunks_count}]", flush=True)
+    if len(share_link_ids) == 0:
+        return sharing_links
+    try:
+        links_responses = links_batch.send()
+        for item_id, share_link_id in share_link_ids.items():
+            links_responses[share_link_id].raise_for_status()
+            sharing_links[item_id] = links_responses[share_link_id].json()["link"]["webUrl"]
+            set_stored_sharing_link(item_id=item_id, link_url=sharing_links[item_id])
+    except HTTPError as e:
+        logging.error("Cannot create SharePoint sharing links")
+        raise RuntimeError("Cannot create SharePoint sharing links") from e
+    return sharing_links
 
-                chunk_data = src_file.read(chunk_size)
-                if not chunk_data:
-                    break
 
-                # calculate range headers
-                range_start = chunk_index * chunk_size
-                range_end = range_start + chunk_size
-                if (chunk_index == chunks_count) or (chunk_index == 0 and chunks_count == 1):
-                    range_end = range_start + chunks_leftover
-                print(f"bytes {range_start}-{range_end - 1}/{total_file_size}")
-                headers = {
-                    "Content-Length": str(chunk_size),
-                    "Content-Range": f"bytes {range_start}-{range_end - 1}/{total_file_size}",
-                }
-
-                headers["Authorization"] = f"Bearer {auth_token}"
-                chunk_upload = requests.put(
-                    url=upload_session_data["uploadUrl"],
-                    data=chunk_data,
-                    headers=headers,
-                )
-                chunk_upload.raise_for_status()
-        upload_item_data: dict = chunk_upload.json()
+def upload_sharepoint_small_file(
+    file_path: Path, file_metadata: Dict[str, str], directory_id: str, sharing_link: bool = False
+) -> dict:
+    """
+    Upload a small file (including empty files) with a single request, rather than using an upload session
+
+    The file is uploaded, and its metadata and sharing link set, in a single batch, with the file addressed by its path
+    (as its ID isn't known until uploaded). Graph runs the metadata and sharing link requests once the upload succeeds.
+    """
+    import quickxorhash
+    from requests import HTTPError
+
+    logging.info("uploading small file")
+    started_at = monotonic()
+    file_stat = file_path.stat()
+    file_data = file_path.read_bytes()
+    quickxor = quickxorhash.quickxorhash()
+    quickxor.update(file_data)
+    quickxor_hash = encode_quickxor_hash(quickxor)
+
+    file_batch = GraphBatch(client=get_graph_client())
+    file_url = f"/drives/{sharepoint_drive_id}/items/{directory_id}:/{file_path.name}:"
+    upload_id = file_batch.add(
+        method="PUT",
+        url=f"{file_url}/content?@microsoft.graph.conflictBehavior=fail",
+        headers={"Content-Type": "application/octet-stream"},
+        data=file_data,
+    )
+    logging.info("Setting file metadata")
+    set_file_metadata_id = file_batch.add(
+        method="PATCH", url=f"{file_url}/listItem/fields", json=file_metadata, depends_on=[upload_id]
+    )
+    share_link_id: Optional[str] = None
+    if sharing_link:
+        logging.info("Creating organisation sharing link")
+        share_link_id = file_batch.add(
+            method="POST",
+            url=f"{file_url}/createLink",
+            json={"type": "view", "scope": "organization"},
+            depends_on=[upload_id],
+        )
+
+    try:
+        file_responses = file_batch.send()
+        file_responses[upload_id].raise_for_status()
+        upload_item_data: dict = file_responses[upload_id].json()
     except HTTPError as e:
         logging.error("Cannot upload SharePoint file")
         raise RuntimeError("Cannot upload SharePoint file") from e
-
-    file_uri = upload_item_data["webUrl"]
+    set_indexed_item(parent_id=directory_id, item_data=upload_item_data)
 
     # verify hash
-    if upload_item_data["file"]["hashes"]["quickXorHash"] != hash_file_quickxor(file_path=file_path):
+    if upload_item_data["file"]["hashes"]["quickXorHash"] != quickxor_hash:
         raise RuntimeError("Hash for uploaded file does not match file artefact")
+    set_cached_file_hashes(file_path=file_path, file_stat=file_stat, quickxor_hash=quickxor_hash)
 
     try:
-        logging.info("Setting file metadata")
-        set_sharepoint_file_metadata(file_id=upload_item_data["id"], file_metadata=file_metadata)
+        file_responses[set_file_metadata_id].raise_for_status()
     except HTTPError as e:
         logging.error("Cannot set SharePoint directory metadata")
         raise RuntimeError("Cannot set SharePoint directory metadata") from e
+    file_uri = upload_item_data["webUrl"]
+    if share_link_id is not None:
+        file_responses[share_link_id].raise_for_status()
+        file_uri = file_responses[share_link_id].json()["link"]["webUrl"]
+        set_stored_sharing_link(item_id=upload_item_data["id"], link_url=file_uri)
+
+    set_mirror_item(
+        parent_id=directory_id,
+        item_data=upload_item_data,
+        resource_id=file_metadata.get("resource_id"),
+        artefact_id=file_metadata.get("artefact_id"),
+    )
+
+    duration = max(monotonic() - started_at, 1e-6)
+    metrics = {
+        "file_size": file_stat.st_size,
+        "upload_size": file_stat.st_size,
+        "chunks_count": 1,
+        "simple_upload": True,
+        "duration": round(duration, 3),
+        "throughput": round(file_stat.st_size / duration),
+    }
+    logging.info(f"Uploaded '{file_path.name}' ({file_stat.st_size} bytes) in {metrics['duration']}s")
+    return {"file_uri": file_uri, "upload_metrics": metrics}
+
+
+def set_sharepoint_file_properties(
+    file_item_data: dict, directory_id: str, file_metadata: Dict[str, str], sharing_link: bool
+) -> str:
+    """
+    Set metadata for a new file, and optionally create an organisation sharing link for it
+
+    The file is added to the local mirror of the drive (with its metadata), so it can be found as an existing deposit.
+    Returns the URI for the file, which is the sharing link if created.
+    """
+    from requests import HTTPError
+
+    file_uri = file_item_data["webUrl"]
+
+    # metadata and sharing link are independent, so are set together
+    file_batch = GraphBatch(client=get_graph_client())
+
+    logging.info("Setting file metadata")
+    set_file_metadata_id = set_sharepoint_file_metadata(
+        file_id=file_item_data["id"], file_metadata=file_metadata, batch=file_batch
+    )
 
+    share_link_id: Optional[str] = None
     if sharing_link:
         logging.info("Creating organisation sharing link")
-        share_link = requests.post(
-            url=f"https://graph.microsoft.com/v1.0/drives/{sharepoint_drive_id}/items/{upload_item_data['id']}/createLink",
-            headers={"Authorization": f"Bearer {auth_token}"},
+        share_link_id = file_batch.add(
+            method="POST",
+            url=f"/drives/{sharepoint_drive_id}/items/{file_item_data['id']}/createLink",
             json={
                 "type": "view",
                 "scope": "organization",
             },
         )
-        share_link.raise_for_status()
-        share_link_data: dict = share_link.json()
-        file_uri = share_link_data["link"]['webUrl']
 
-    return {"file_uri": file_uri}
+    try:
+        file_responses = file_batch.send()
+        file_responses[set_file_metadata_id].raise_for_status()
+    except HTTPError as e:
+        logging.error("Cannot set SharePoint directory metadata")
+        raise RuntimeError("Cannot set SharePoint directory metadata") from e
+    if share_link_id is not None:
+        file_responses[share_link_id].raise_for_status()
+        share_link_data: dict = file_responses[share_link_id].json()
+        file_uri = share_link_data["link"]["webUrl"]
+        set_stored_sharing_link(item_id=file_item_data["id"], link_url=file_uri)
+
+    set_mirror_item(
+        parent_id=directory_id,
+        item_data=file_item_data,
+        resource_id=file_metadata.get("resource_id"),
+        artefact_id=file_metadata.get("artefact_id"),
+    )
+    return file_uri
+
+
+def copy_sharepoint_file(
+    source_id: str, file_name: str, file_metadata: Dict[str, str], directory_id: str, sharing_link: bool = False
+) -> Optional[dict]:
+    """
+    Copy an existing file (server-side) into a directory, rather than uploading the same contents again
+
+    Graph copies files asynchronously, so the copy is monitored until complete (up to `copy_timeout` seconds). The
+    copy has its own metadata and sharing link set, as for uploaded files, and inherits permissions from its directory.
+
+    Returns None if the file can't be copied (e.g. the source file no longer exists), so it can be uploaded instead.
+    Errors once the copy exists (i.e. setting its properties) are raised as for uploaded files.
+    """
+    from requests import HTTPError
+
+    logging.debug(f"Source ID: '{source_id}'")
+    logging.debug(f"File name: '{file_name}'")
+    logging.debug(f"Directory ID: '{directory_id}'")
+
+    started_at = monotonic()
+    try:
+        logging.info("Copying file")
+        copy_request = get_graph_client().post(
+            url=f"/drives/{sharepoint_drive_id}/items/{source_id}/copy?@microsoft.graph.conflictBehavior=fail",
+            json={"parentReference": {"driveId": sharepoint_drive_id, "id": directory_id}, "name": file_name},
+        )
+        copy_request.raise_for_status()
+        monitor_url = copy_request.headers["Location"]
+
+        while True:
+            # monitor URLs are pre-authenticated, and redirect to the new item once complete
+            copy_status = get_graph_client().get(url=monitor_url, authenticate=False, allow_redirects=False)
+            if copy_status.status_code != HTTPStatus.SEE_OTHER:
+                copy_status.raise_for_status()
+            copy_status_data = copy_status.json() if copy_status.content else {}
+            logging.debug(f"Copy status: {copy_status_data.get('status')}")
+            if copy_status.status_code == HTTPStatus.SEE_OTHER or copy_status_data.get("status") == "completed":
+                break
+            if copy_status_data.get("status") == "failed":
+                logging.warning("SharePoint file copy failed")
+                return None
+            if monotonic() - started_at > copy_timeout:
+                logging.warning("SharePoint file copy did not complete in time")
+                return None
+            sleep(copy_poll_interval)
+
+        invalidate_indexed_items(parent_id=directory_id, item_name=file_name)
+        copy_item_data = get_sharepoint_file(directory_id=directory_id, file_name=file_name)
+    except HTTPError as e:
+        logging.warning(f"Cannot copy SharePoint file: {e.response.status_code}")
+        return None
+
+    file_uri = set_sharepoint_file_properties(
+        file_item_data=copy_item_data,
+        directory_id=directory_id,
+        file_metadata=file_metadata,
+        sharing_link=sharing_link,
+    )
+    copy_metrics = {
+        "file_size": copy_item_data.get("size"),
+        "upload_size": 0,
+        "copied_from": source_id,
+        "duration": round(monotonic() - started_at, 3),
+    }
+    logging.info(f"Copied '{file_name}' from existing file '{source_id}' in {copy_metrics['duration']}s")
+    return {"file_uri": file_uri, "upload_metrics": copy_metrics}
+
 
+def get_resource_directory(resource_id: str) -> dict:
+    logging.info(f"Getting information about resource directory for: '{resource_id}'")
+    return get_sharepoint_directory(directory_name=resource_id)
+
+
+def invalidate_resource_index(resource_id: str) -> None:
+    """
+    Remove a resource directory, and any files within it, from the local item index
+    """
+    logging.info(f"Removing resource directory for '{resource_id}' from item index")
+    with open_state_db() as state_db:
+        state_db.execute(
+            "DELETE FROM item_index WHERE drive_id = ? AND parent_id IN "
+            "(SELECT item_id FROM item_index WHERE drive_id = ? AND parent_id = 'root' AND item_name = ?)",
+            (sharepoint_drive_id, sharepoint_drive_id, resource_id),
+        )
+    invalidate_indexed_items(parent_id="root", item_name=resource_id)
+
+
+def get_resource_sharing_links(resource_id: str) -> Dict[str, str]:
+    """
+    Get organisation sharing links for all artefacts deposited for a resource, creating any missing together
+
+    Artefacts are found from the local mirror of the drive (see `sync_sharepoint_drive()`), and only shared where the
+    constraint in the record for the resource allows all NERC staff (the '~nerc' alias) access.
+
+    Returns sharing links by artefact ID.
+    """
+    constraint = get_record_config(resource_id=resource_id).config["identification"]["constraints"][0]
+    if "alias" not in constraint["permissions"][0] or constraint["permissions"][0]["alias"] != ["~nerc"]:
+        logging.error(f"Artefacts for resource '{resource_id}' cannot be shared with an organisation sharing link")
+        raise RuntimeError(f"Artefacts for resource '{resource_id}' cannot be shared with an organisation sharing link")
 
-def get_resource_directory(resource_id: str) -> dict:
-    logging.info(f"Getting information about resource directory for: '{resource_id}'")
-    return get_sharepoint_directory(directory_name=resource_id)
+    with open_state_db() as state_db:
+        artefact_items = state_db.execute(
+            "SELECT item_id, artefact_id FROM mirror_items WHERE drive_id = ? AND resource_id = ? AND is_folder = 0 "
+            "AND artefact_id IS NOT NULL AND artefact_id != '-'",
+            (sharepoint_drive_id, resource_id),
+        ).fetchall()
+    sharing_links = get_sharing_links(item_ids=[artefact_item["item_id"] for artefact_item in artefact_items])
+    return {artefact_item["artefact_id"]: sharing_links[artefact_item["item_id"]] for artefact_item in artefact_items}
 
 
 def create_resource_directory(resource_id: str, constraint: dict) -> None:
@@ -432,12 +2342,10 @@ def create_resource_directory(resource_id: str, constraint: dict) -> None:
     logging.debug("Constraint:")
     logging.debug(constraint)
 
-    recipients: Optional[List[Dict[str, str]]] = None
+    recipients: Optional[List[str]] = None
     if "object_id" in constraint["permissions"][0]:
         logging.debug("Processing permissions as sharing recipients")
-        recipients = []
-        for object_id in constraint["permissions"][0]["object_id"]:
-            recipients.append({"objectID": object_id})
+        recipients = list(constraint["permissions"][0]["object_id"])
 
     create_sharepoint_directory(
         directory_name=resource_id,
@@ -475,16 +2383,39 @@ def upload_resource_artefact(
         logging.debug("Enabling sharing link")
         sharing_link = True
 
-    upload_data = upload_sharepoint_file(
-        file_path=artefact_path,
-        file_metadata={"resource_id": resource_id, "artefact_id": artefact_id},
-        directory_id=resource_directory_id,
-        sharing_link=sharing_link,
-    )
+    upload_data: Optional[dict] = None
+    file_metadata = {"resource_id": resource_id, "artefact_id": artefact_id}
+    deposited_file: Optional[dict] = None
+    artefact_size = artefact_path.stat().st_size
+    # small files are uploaded in a single request, which is quicker than copying, and files are only hashed (which
+    # means reading them in full before uploading) if a deposited file of the same size exists
+    if upload_dedup and artefact_size > upload_simple_max_size and has_deposited_file_size(file_size=artefact_size):
+        logging.info("Checking if artefact contents already deposited")
+        deposited_file = find_deposited_file(
+            quickxor_hash=hash_file_quickxor(file_path=artefact_path), file_size=artefact_size
+        )
+    if deposited_file is not None:
+        upload_data = copy_sharepoint_file(
+            source_id=deposited_file["item_id"],
+            file_name=artefact_path.name,
+            file_metadata=file_metadata,
+            directory_id=resource_directory_id,
+            sharing_link=sharing_link,
+        )
+        if upload_data is None:
+            # the mirror may be out of date (e.g. the file deleted since the last sync)
+            logging.warning("Cannot copy existing file with the same contents, uploading instead")
+    if upload_data is None:
+        upload_data = upload_sharepoint_file(
+            file_path=artefact_path,
+            file_metadata=file_metadata,
+            directory_id=resource_directory_id,
+            sharing_link=sharing_link,
+        )
     artefact_uri = upload_data["file_uri"]
     logging.info(f"Artefact URI: {artefact_uri}")
 
-    return {"artefact_id": artefact_id, "artefact_uri": artefact_uri}
+    return {"artefact_id": artefact_id, "artefact_uri": artefact_uri, "upload_metrics": upload_data["upload_metrics"]}
 
 
 def determine_artefact_media_type(format_uri: str) -> str:
@@ -497,7 +2428,129 @@ def determine_artefact_media_type(format_uri: str) -> str:
     raise LookupError(f"Media type mapping unavailable for artefact format URI '{format_uri}'")
 
 
-def create_artefact_lookup_item(resource_id: str, artefact_id: str, format_uri: str, origin_uri: str) -> None:
+class LookupClient:
+    """
+    Client for registering artefacts with the lookup endpoint used by the Downloads Proxy
+
+    Registered lookup items are recorded in the local lookup store (see `set_stored_lookup_item()`).
+
+    Requests share a pooled session, and are signed with a shared AWS SigV4 signer, so AWS credentials are resolved
+    once, rather than for each request. As credentials may be temporary (e.g. from STS or SSO), the signer is created
+    again (resolving credentials again) every `lookup_signer_max_age` seconds, and when a request is refused (403).
+    Signing can be disabled (`sign`) for local stand-ins of the lookup endpoint (see `test-lookup-stand-in.py`).
+
+    The lookup endpoint registers one lookup item per request, so many items are registered concurrently, up to
+    `concurrency` at once. Registering the same lookup item again has no further effect, so requests are retried on
+    throttling, server and connection errors, up to `lookup_max_retries` times (see `get_retry_delay()`).
+    """
+
+    def __init__(self, endpoint: str = lookup_endpoint, concurrency: Optional[int] = None, sign: bool = True):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        if concurrency is None:
+            concurrency = lookup_concurrency
+        self.endpoint = endpoint
+        self.concurrency = concurrency
+        self.sign = sign
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._auth_lock = Lock()
+        self._auth: Optional[AWSSigV4] = None
+        self._auth_created_at: float = 0
+        # resolve credentials now, so missing credentials are found before any requests are made
+        self._get_auth()
+
+    def _get_auth(self, refresh: bool = False) -> Optional[AWSSigV4]:
+        from requests_auth_aws_sigv4 import AWSSigV4
+
+        if not self.sign:
+            return None
+        with self._auth_lock:
+            if refresh or self._auth is None or monotonic() - self._auth_created_at > lookup_signer_max_age:
+                logging.debug("Resolving AWS credentials for signing lookup requests")
+                try:
+                    self._auth = AWSSigV4("lambda")
+                # raised for missing credentials or region (AttributeError where boto3 is used to find credentials)
+                except (KeyError, AttributeError) as e:
+                    logging.error("Cannot sign lookup requests, AWS credentials or region not found")
+                    raise RuntimeError("Cannot sign lookup requests, AWS credentials or region not found") from e
+                self._auth_created_at = monotonic()
+            return self._auth
+
+    def register(self, lookup_item: Dict[str, str]) -> None:
+        import requests
+
+        auth_refreshed = False
+        for attempt in range(lookup_max_retries + 1):
+            try:
+                lookup_request = self.session.post(url=self.endpoint, json=lookup_item, auth=self._get_auth())
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == lookup_max_retries:
+                    raise
+                retry_delay = get_retry_delay(attempt=attempt)
+                logging.warning(f"Lookup request failed ({e}), retrying in {retry_delay:.1f}s")
+                sleep(retry_delay)
+                continue
+            if lookup_request.status_code == HTTPStatus.FORBIDDEN and self.sign and not auth_refreshed:
+                # credentials may have expired, or been replaced, since the signer was created
+                logging.warning("Lookup request refused (403), resolving AWS credentials again and retrying")
+                self._get_auth(refresh=True)
+                auth_refreshed = True
+                continue
+            if attempt == lookup_max_retries or not (
+                lookup_request.status_code == HTTPStatus.TOO_MANY_REQUESTS
+                or lookup_request.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+            ):
+                break
+            retry_delay = get_retry_delay(attempt=attempt, retry_after=lookup_request.headers.get("Retry-After"))
+            logging.warning(
+                f"Lookup request throttled or failed ({lookup_request.status_code}), retrying in {retry_delay:.1f}s"
+            )
+            sleep(retry_delay)
+        # noinspection PyUnboundLocalVariable
+        lookup_request.raise_for_status()
+        set_stored_lookup_item(lookup_item=lookup_item)
+
+    def register_many(self, lookup_items: List[Dict[str, str]]) -> Iterator[Tuple[Dict[str, str], Optional[str]]]:
+        """
+        Register many lookup items concurrently, returning each item and any error as each is registered
+        """
+        import requests
+        from requests import HTTPError
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            registrations = {
+                executor.submit(self.register, lookup_item=lookup_item): lookup_item for lookup_item in lookup_items
+            }
+            for registration in as_completed(registrations):
+                try:
+                    registration.result()
+                    yield registrations[registration], None
+                except (HTTPError, RuntimeError, requests.ConnectionError, requests.Timeout) as e:
+                    yield registrations[registration], str(e)
+
+
+_lookup_client: Optional[LookupClient] = None
+_lookup_client_lock = Lock()
+
+
+def get_lookup_client() -> LookupClient:
+    """
+    Get the shared lookup client, creating it if needed
+    """
+    global _lookup_client
+
+    with _lookup_client_lock:
+        if _lookup_client is None:
+            logging.debug("Creating lookup client")
+            _lookup_client = LookupClient()
+        return _lookup_client
+
+
+def build_artefact_lookup_item(resource_id: str, artefact_id: str, format_uri: str, origin_uri: str) -> Dict[str, str]:
     logging.debug(f"Resource ID: {resource_id}")
     logging.debug(f"Artefact ID: {artefact_id}")
     logging.debug(f"Format URI: {format_uri}")
@@ -516,9 +2569,89 @@ def create_artefact_lookup_item(resource_id: str, artefact_id: str, format_uri:
     }
     logging.debug("Artefact lookup item:")
     logging.debug(lookup_item)
+    return lookup_item
+
+
+def set_stored_lookup_item(lookup_item: Dict[str, str]) -> None:
+    """
+    Record a registered lookup item in the local lookup store, mirroring lookup items held by the Downloads Proxy
+    """
+    with open_state_db() as state_db:
+        state_db.execute(
+            "INSERT OR REPLACE INTO lookup_items VALUES (?, ?, ?, ?, ?)",
+            (
+                lookup_item["artefact_id"],
+                lookup_item["resource_id"],
+                lookup_item["media_type"],
+                lookup_item["origin_uri"],
+                time(),
+            ),
+        )
+
+
+def get_stored_lookup_items(
+    resource_id: Optional[str] = None, artefact_id: Optional[str] = None, origin_uri: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """
+    Get lookup items from the local lookup store, optionally filtered by resource, artefact and/or origin URI
+
+    With no filters, all lookup items are returned. Lookup items are returned in the order they were registered.
+    """
+    query = "SELECT resource_id, artefact_id, media_type, origin_uri FROM lookup_items WHERE 1 = 1"
+    params: List[str] = []
+    for column, value in [("resource_id", resource_id), ("artefact_id", artefact_id), ("origin_uri", origin_uri)]:
+        if value is not None:
+            query += f" AND {column} = ?"
+            params.append(value)
+    with open_state_db() as state_db:
+        return [dict(lookup_item) for lookup_item in state_db.execute(f"{query} ORDER BY registered_at", params)]
+
+
+def export_stored_lookup_items(
+    export_file: TextIO,
+    resource_id: Optional[str] = None,
+    artefact_id: Optional[str] = None,
+    origin_uri: Optional[str] = None,
+) -> int:
+    """
+    Export lookup items from the local lookup store as JSON Lines, e.g. to re-seed the Downloads Proxy
 
-    deposit_request = requests.post(url=lookup_endpoint, json=lookup_item, auth=AWSSigV4("lambda"))
-    deposit_request.raise_for_status()
+    Lookup items are filtered as for `get_stored_lookup_items()`. The export can be registered using the 'register'
+    command. Returns the number of lookup items exported.
+    """
+    lookup_items = get_stored_lookup_items(resource_id=resource_id, artefact_id=artefact_id, origin_uri=origin_uri)
+    for lookup_item in lookup_items:
+        export_file.write(json.dumps(lookup_item) + "\n")
+    return len(lookup_items)
+
+
+def create_artefact_lookup_item(resource_id: str, artefact_id: str, format_uri: str, origin_uri: str) -> None:
+    lookup_item = build_artefact_lookup_item(
+        resource_id=resource_id, artefact_id=artefact_id, format_uri=format_uri, origin_uri=origin_uri
+    )
+    get_lookup_client().register(lookup_item=lookup_item)
+
+
+def load_lookup_items(lookup_items_path: Path) -> List[Dict[str, str]]:
+    """
+    Load lookup items from a JSON Lines file, one item per line (with 'resource_id', 'artefact_id', 'media_type' and
+    'origin_uri' properties)
+    """
+    logging.info(f"Loading lookup items from: '{lookup_items_path.resolve()}'")
+    lookup_items = []
+    with open(lookup_items_path, mode="r") as lookup_items_file:
+        for line_number, line in enumerate(lookup_items_file, start=1):
+            if line.strip() == "":
+                continue
+            try:
+                lookup_item = json.loads(line)
+                lookup_items.append(
+                    {key: lookup_item[key] for key in ["resource_id", "artefact_id", "media_type", "origin_uri"]}
+                )
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                logging.error(f"Lookup item on line {line_number} is not valid")
+                raise RuntimeError(f"Lookup item on line {line_number} is not valid") from e
+    return lookup_items
 
 
 def deposit_resource_artefact(resource_id: str, resource_directory_id: str, constraint: dict, artefact: dict) -> dict:
@@ -529,13 +2662,15 @@ def deposit_resource_artefact(resource_id: str, resource_directory_id: str, cons
     logging.debug(f"Artefact:")
     logging.debug(artefact)
 
-    # Crude check for existing deposit
-    logging.debug("Crudely checking if artefact already deposited")
-    if download_endpoint in artefact["transfer_option"]["online_resource"]["href"]:
-        artefact_id: str = str(artefact["transfer_option"]["online_resource"]["href"]).replace(
-            f"{download_endpoint}/", ""
-        )
+    # artefacts already deposited have a download URL in place of a local file
+    logging.debug("Checking if artefact already deposited")
+    artefact_uri: str = artefact["transfer_option"]["online_resource"]["href"]
+    if artefact_uri.startswith(f"{download_endpoint}/"):
+        artefact_id: str = artefact_uri.removeprefix(f"{download_endpoint}/")
         logging.info(f"Artefact already deposited with ID: '{artefact_id}'")
+        if len(get_stored_lookup_items(artefact_id=artefact_id)) == 0:
+            # e.g. deposited elsewhere, or before lookup items were recorded locally
+            logging.warning(f"No local record of lookup item for artefact '{artefact_id}'")
         return {"artefact_id": artefact_id, "artefact": artefact, "existing_deposit": True}
 
     upload_data = upload_resource_artefact(
@@ -549,18 +2684,81 @@ def deposit_resource_artefact(resource_id: str, resource_directory_id: str, cons
     )
     artefact["transfer_option"]["online_resource"]["href"] = f"{download_endpoint}/{upload_data['artefact_id']}"
 
-    return {"artefact_id": upload_data["artefact_id"], "artefact": artefact, "existing_deposit": False}
+    return {
+        "artefact_id": upload_data["artefact_id"],
+        "artefact": artefact,
+        "existing_deposit": False,
+        "upload_metrics": upload_data["upload_metrics"],
+    }
+
+
+async def deposit_resource_artefacts_concurrently(
+    resource_id: str,
+    resource_directory_id: str,
+    constraint: dict,
+    distribution_options: List[dict],
+    concurrency: Optional[int] = None,
+) -> List[Union[dict, BaseException]]:
+    """
+    Deposit artefacts for a resource concurrently
+
+    Up to `concurrency` artefacts are deposited at once, so a resource takes around as long as its largest artefact to
+    deposit, rather than the sum of all of them. Deposits run in worker threads, sharing the pooled Graph client.
+
+    Results are returned in the same order as `distribution_options`, with any errors returned in place of the result
+    for that artefact (rather than raised), so the deposits that did succeed can still be recorded.
+    """
+    import asyncio
+
+    if concurrency is None:
+        concurrency = deposit_concurrency
+    deposit_slots = asyncio.Semaphore(concurrency)
+    _distribution_options_count = len(distribution_options)
+
+    async def _deposit_resource_artefact(distribution_index: int, distribution_option: dict) -> dict:
+        async with deposit_slots:
+            logging.info(f"Processing distribution option [{distribution_index + 0}/{_distribution_options_count}]")
+            logging.debug("Distribution option:")
+            logging.debug(distribution_option)
+            return await asyncio.to_thread(
+                deposit_resource_artefact,
+                resource_id=resource_id,
+                resource_directory_id=resource_directory_id,
+                constraint=constraint,
+                artefact=distribution_option,
+            )
+
+    return await asyncio.gather(
+        *[
+            _deposit_resource_artefact(distribution_index=distribution_index, distribution_option=distribution_option)
+            for distribution_index, distribution_option in enumerate(distribution_options)
+        ],
+        return_exceptions=True,
+    )
+
 
+def deposit_resource_artefacts(resource_id: Optional[str] = None, record_path: Optional[Path] = None) -> dict:
+    """
+    Deposit artefacts listed in the metadata record for a resource, updating the record with download URLs
 
-def deposit_resource_artefacts(resource_id: str) -> dict:
-    record_config = get_record_config(resource_id=resource_id)
+    The record is either the one mapped to `resource_id`, or the record file at `record_path` (e.g. a record dropped
+    into the directory watched by `serve_deposits()`), where the resource is given by the record's file identifier.
+    """
+    import asyncio
+
+    if record_path is not None:
+        logging.info(f"Loading record from: '{record_path}'")
+        record_config = load_record_config(record_path=record_path)
+        resource_id = record_config.config["file_identifier"]
+    else:
+        record_config = get_record_config(resource_id=resource_id)
     validate_record_config(record_config=record_config)
 
-    deposit_data_ = {"artefacts": []}
+    deposit_data_ = {"resource_id": resource_id, "artefacts": []}
 
     logging.info("processing constraints to apply to artefacts")
     constraint = record_config.config["identification"]["constraints"][0]
-    logging.debug('Selected constraint:')
+    logging.debug("Selected constraint:")
     logging.debug(constraint)
 
     logging.info("setting up directory for resource artefacts")
@@ -570,40 +2768,494 @@ def deposit_resource_artefacts(resource_id: str) -> dict:
     logging.info("processing distribution options in resource")
     _distribution_options_count = len(record_config.config["distribution"])
     logging.debug(f"total distribution options: {_distribution_options_count}")
-    for distribution_index, distribution_option in enumerate(record_config.config["distribution"]):
-        logging.info(f"Processing distribution option [{distribution_index + 0}/{_distribution_options_count}]")
-        logging.debug("Distribution option:")
-        logging.debug(distribution_option)
-
-        deposit_data = deposit_resource_artefact(
+    deposits_data = asyncio.run(
+        deposit_resource_artefacts_concurrently(
             resource_id=resource_id,
             resource_directory_id=resource_directory_id,
             constraint=constraint,
-            artefact=distribution_option,
+            distribution_options=record_config.config["distribution"],
         )
+    )
+
+    # update record in distribution option order, regardless of when each deposit finished
+    deposit_error: Optional[BaseException] = None
+    for distribution_index, deposit_data in enumerate(deposits_data):
+        if isinstance(deposit_data, BaseException):
+            if deposit_error is None:
+                deposit_error = deposit_data
+            continue
         distribution_option = deposit_data["artefact"]
         logging.debug("Distribution option:")
         logging.debug(distribution_option)
         record_config.config["distribution"][distribution_index] = distribution_option
         deposit_data_["artefacts"].append(
-            {"artefact_id": deposit_data["artefact_id"], "existing_deposit": deposit_data["existing_deposit"]}
+            {
+                "artefact_id": deposit_data["artefact_id"],
+                "existing_deposit": deposit_data["existing_deposit"],
+                "upload_metrics": deposit_data.get("upload_metrics"),
+            }
         )
 
+    if deposit_error is not None:
+        # save artefacts that were deposited, so they aren't deposited again
+        logging.error("Cannot deposit all artefacts, saving record for artefacts that were deposited")
+        save_record_config(record_config=record_config, record_path=record_path)
+        # failures may be due to the index being out of date (e.g. the directory being removed), so look up again
+        invalidate_resource_index(resource_id=resource_id)
+        raise deposit_error
+
     validate_record_config(record_config=record_config)
-    save_record_config(record_config=record_config)
+    save_record_config(record_config=record_config, record_path=record_path)
 
     logging.debug("deposit data:")
     logging.debug(deposit_data_)
     return deposit_data_
 
 
+_deposit_locks: Dict[str, Lock] = {}
+_deposit_locks_lock = Lock()
+
+
+def get_deposit_lock(deposit_key: str) -> Lock:
+    """
+    Get the lock for depositing a resource (or record file), creating it if needed
+    """
+    with _deposit_locks_lock:
+        if deposit_key not in _deposit_locks:
+            _deposit_locks[deposit_key] = Lock()
+        return _deposit_locks[deposit_key]
+
+
+def deposit_resource(resource_id: Optional[str] = None, record_path: Optional[Path] = None) -> dict:
+    """
+    Deposit artefacts for a resource, or a record file, returning the outcome rather than raising errors
+
+    Intended for depositing many resources, where one resource failing shouldn't stop others being deposited.
+
+    Deposits for the same resource (or record file) are made one at a time, as otherwise each would upload the same
+    artefacts and overwrite the record saved by the other. Workers depositing a resource already being deposited wait
+    for the earlier deposit to finish, which then skips artefacts already deposited.
+    """
+    started_at = monotonic()
+    result = {"resource_id": resource_id, "status": "ok", "deposit": None, "error": None, "context": None}
+    if record_path is not None:
+        result["record_path"] = str(record_path)
+    try:
+        if record_path is None and resource_id not in list_resources():
+            raise RuntimeError(f"Unable to find resource '{resource_id}'")
+        with get_deposit_lock(deposit_key=resource_id if record_path is None else str(record_path.resolve())):
+            result["deposit"] = deposit_resource_artefacts(resource_id=resource_id, record_path=record_path)
+        result["resource_id"] = result["deposit"]["resource_id"]
+    except Exception as e:
+        logging.error(f"Cannot deposit artefacts for resource '{resource_id or record_path}'")
+        result["status"] = "error"
+        result["error"] = str(e)
+        if e.__cause__ is not None:
+            result["context"] = str(e.__cause__)
+    result["duration"] = round(monotonic() - started_at, 3)
+    return result
+
+
+def deposit_resources(jobs: List[dict], report_path: Path, workers: Optional[int] = None) -> Dict[str, int]:
+    """
+    Deposit artefacts for many resources, using a pool of workers
+
+    Jobs are as parsed by `parse_deposit_job()`, and processed using `process_deposit_job()`. Up to `workers` jobs are
+    processed at once, sharing the Graph client, auth token and other state within this process. The outcome for each
+    job is appended to a JSON Lines report as it finishes.
+
+    Duplicate jobs (e.g. a resource given as an argument and in a jobs file) are only processed once.
+
+    Returns the number of jobs that succeeded, and that failed.
+    """
+    if workers is None:
+        workers = deposit_batch_workers
+    unique_jobs = {(job["action"], job["resource_id"], job["record_path"]): job for job in jobs}
+    if len(unique_jobs) < len(jobs):
+        logging.info(f"Skipping {len(jobs) - len(unique_jobs)} duplicate jobs")
+        jobs = list(unique_jobs.values())
+    logging.info(f"Depositing {len(jobs)} resources with {workers} workers")
+    logging.debug(f"Report path: '{report_path.resolve()}'")
+    get_graph_client(workers=workers)
+
+    summary = {"ok": 0, "error": 0}
+    with ThreadPoolExecutor(max_workers=workers) as executor, open(report_path, mode="a") as report_file:
+        deposits = [executor.submit(process_deposit_job, job=job) for job in jobs]
+        for deposit in as_completed(deposits):
+            report_deposit_result(result=deposit.result(), report_file=report_file, summary=summary)
+    return summary
+
+
+def report_deposit_result(result: dict, report_file: TextIO, summary: Dict[str, int]) -> None:
+    summary[result["status"]] += 1
+    report_file.write(json.dumps(result) + "\n")
+    report_file.flush()
+    if result["resource_id"] is None and result.get("record_path") is not None:
+        print(f"{'OK' if result['status'] == 'ok' else 'No'}. Record '{result['record_path']}'.", flush=True)
+        return
+    print(f"{'OK' if result['status'] == 'ok' else 'No'}. Resource '{result['resource_id']}'.", flush=True)
+
+
+def load_deposit_jobs(jobs_path: Path) -> List[dict]:
+    """
+    Load jobs from a JSON Lines file, one job per line, as parsed by `parse_deposit_job()`
+
+    Unlike `read_deposit_jobs()`, all jobs are loaded at once and an invalid job raises an error, so no jobs are
+    processed from a file with mistakes in it.
+    """
+    logging.info(f"Loading jobs from: '{jobs_path.resolve()}'")
+    jobs = []
+    with open(jobs_path, mode="rb") as jobs_file:
+        for line_number, line in enumerate(jobs_file, start=1):
+            if line.strip() == b"":
+                continue
+            try:
+                jobs.append(parse_deposit_job(job_data=line))
+            except ValueError as e:
+                logging.error(f"Line {line_number}: {e}")
+                raise RuntimeError(f"Line {line_number}: {e}") from e
+    return jobs
+
+
+def get_ingest_checkpoint(jobs_path: Path, jobs_stat: os.stat_result) -> int:
+    """
+    Get the offset to resume reading a jobs file from, or 0 to read from the start
+
+    Checkpoints are only used where the jobs file is unchanged (based on its size, modification time and inode) and
+    the offset is within the file. Otherwise the checkpoint is removed, so a regenerated file doesn't skip jobs.
+    """
+    with open_state_db() as state_db:
+        entry = state_db.execute(
+            "SELECT * FROM ingest_checkpoints WHERE jobs_path = ?", (str(jobs_path.resolve()),)
+        ).fetchone()
+    if entry is None:
+        return 0
+    if (
+        entry["file_size"] != jobs_stat.st_size
+        or entry["file_mtime_ns"] != jobs_stat.st_mtime_ns
+        or entry["file_inode"] != jobs_stat.st_ino
+        or entry["job_offset"] > jobs_stat.st_size
+    ):
+        logging.info("Jobs file changed since previous checkpoint, discarding checkpoint")
+        delete_ingest_checkpoint(jobs_path=jobs_path)
+        return 0
+    return entry["job_offset"]
+
+
+def set_ingest_checkpoint(jobs_path: Path, jobs_stat: os.stat_result, job_offset: int) -> None:
+    with open_state_db() as state_db:
+        state_db.execute(
+            "INSERT OR REPLACE INTO ingest_checkpoints VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                str(jobs_path.resolve()),
+                jobs_stat.st_size,
+                jobs_stat.st_mtime_ns,
+                jobs_stat.st_ino,
+                job_offset,
+                time(),
+            ),
+        )
+
+
+def delete_ingest_checkpoint(jobs_path: Path) -> None:
+    with open_state_db() as state_db:
+        state_db.execute("DELETE FROM ingest_checkpoints WHERE jobs_path = ?", (str(jobs_path.resolve()),))
+
+
+def parse_deposit_job(job_data: Union[str, bytes]) -> dict:
+    """
+    Parse a deposit job from JSON, raising a ValueError if not valid
+
+    Jobs are objects with either a 'resource_id', or a 'record_path' to a record file, and an optional 'action'
+    ('deposit' (default) or 'withdraw') property.
+    """
+    try:
+        job = json.loads(job_data)
+        if job.get("resource_id") is None and job.get("record_path") is None:
+            raise KeyError("resource_id")
+        return {
+            "action": job.get("action", "deposit"),
+            "resource_id": job.get("resource_id"),
+            "record_path": job.get("record_path"),
+        }
+    except (json.JSONDecodeError, UnicodeDecodeError, AttributeError, KeyError) as e:
+        raise ValueError("Job is not valid, expected an object with a 'resource_id' or 'record_path'") from e
+
+
+def read_deposit_jobs(jobs_file: BinaryIO, offset: int = 0) -> Iterator[Tuple[int, dict]]:
+    """
+    Read jobs from a JSON Lines stream one line at a time, yielding each job with the offset of the line after it
+
+    Jobs are parsed using `parse_deposit_job()`. Invalid jobs are yielded as errors (with an 'error' property) so they
+    can be reported without stopping other jobs.
+
+    Offsets are in bytes from the start of the stream, where `offset` is the position the stream was read from.
+    """
+    line_number = 0
+    while True:
+        line = jobs_file.readline()
+        if line == b"":
+            return
+        line_number += 1
+        offset += len(line)
+        if line.strip() == b"":
+            continue
+        try:
+            job = parse_deposit_job(job_data=line)
+        except ValueError as e:
+            logging.error(f"Line {line_number}: {e}")
+            job = {"action": None, "resource_id": None, "record_path": None, "error": f"Line {line_number}: {e}"}
+        yield offset, job
+
+
+def process_deposit_job(job: dict) -> dict:
+    """
+    Process a deposit job, returning the outcome in the same form as `deposit_resource()` plus the job action
+    """
+    if job["action"] == "deposit":
+        record_path = Path(job["record_path"]) if job["record_path"] is not None else None
+        return {"action": job["action"], **deposit_resource(resource_id=job["resource_id"], record_path=record_path)}
+
+    result = {**job, "status": "error", "deposit": None, "error": job.get("error"), "context": None, "duration": 0}
+    if job["action"] == "withdraw":
+        # recorded as failed, rather than skipped, so these jobs can be run again once withdrawing is supported
+        result["error"] = "Withdrawing resources is not supported"
+    elif result["error"] is None:
+        result["error"] = f"Unknown action '{job['action']}'"
+    logging.error(f"Cannot process job for resource '{job['resource_id'] or job['record_path']}': {result['error']}")
+    return result
+
+
+def ingest_deposit_jobs(
+    jobs_file: BinaryIO,
+    report_path: Path,
+    workers: Optional[int] = None,
+    checkpoint_path: Optional[Path] = None,
+) -> Dict[str, int]:
+    """
+    Process deposit jobs streamed from a JSON Lines file or stdin, using a pool of workers
+
+    Jobs are read as workers become free, with at most `deposit_ingest_queue_size` jobs read ahead of them, so large
+    job files (e.g. for re-depositing the whole catalogue) aren't loaded at once and can be streamed from elsewhere.
+    Results are appended to a JSON Lines report as each job finishes, as for `deposit_resources()`.
+
+    If `checkpoint_path` is set (i.e. for jobs files rather than stdin), jobs are read from the last checkpoint for
+    that path, and the checkpoint is moved past each job once it, and all jobs before it, have finished. If stopped,
+    jobs after the checkpoint are processed again when resumed. The checkpoint is removed once all jobs have finished,
+    so running the same file again processes all of its jobs again.
+
+    Returns the number of jobs that succeeded, and that failed.
+    """
+    if workers is None:
+        workers = deposit_batch_workers
+    offset = 0
+    jobs_stat = None
+    if checkpoint_path is not None:
+        jobs_stat = os.fstat(jobs_file.fileno())
+        offset = get_ingest_checkpoint(jobs_path=checkpoint_path, jobs_stat=jobs_stat)
+        jobs_file.seek(offset)
+        logging.info(f"Resuming jobs from offset {offset} in '{checkpoint_path.resolve()}'")
+    logging.info(f"Processing jobs with {workers} workers")
+    logging.debug(f"Report path: '{report_path.resolve()}'")
+    get_graph_client(workers=workers)
+
+    summary = {"ok": 0, "error": 0}
+    # jobs in the order they were read, so the checkpoint only moves past jobs once all jobs before them have finished
+    jobs_read: deque = deque()
+    jobs_in_flight: Set[Future] = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor, open(report_path, mode="a") as report_file:
+
+        def finish_jobs(return_when: str) -> None:
+            done, _ = wait(jobs_in_flight, return_when=return_when)
+            for job in done:
+                jobs_in_flight.remove(job)
+                report_deposit_result(result=job.result(), report_file=report_file, summary=summary)
+
+            checkpoint_offset = None
+            while len(jobs_read) > 0 and jobs_read[0][1].done():
+                checkpoint_offset, _ = jobs_read.popleft()
+            if checkpoint_path is not None and checkpoint_offset is not None:
+                set_ingest_checkpoint(jobs_path=checkpoint_path, jobs_stat=jobs_stat, job_offset=checkpoint_offset)
+
+        for job_offset, job in read_deposit_jobs(jobs_file=jobs_file, offset=offset):
+            # back-pressure, stop reading jobs until workers catch up
+            while len(jobs_in_flight) >= workers + deposit_ingest_queue_size:
+                finish_jobs(return_when=FIRST_COMPLETED)
+            deposit = executor.submit(process_deposit_job, job=job)
+            jobs_read.append((job_offset, deposit))
+            jobs_in_flight.add(deposit)
+        while len(jobs_in_flight) > 0:
+            finish_jobs(return_when=ALL_COMPLETED)
+    if checkpoint_path is not None:
+        delete_ingest_checkpoint(jobs_path=checkpoint_path)
+    return summary
+
+
+def warm_deposit_clients() -> None:
+    """
+    Set up clients and state used for deposits in advance, so the first deposit doesn't wait for them
+
+    As well as loading the auth token, schema validator and lookup client, a request is made to Graph so a connection
+    is already open (and TLS negotiated) when the first deposit is made. Dependencies only imported when a deposit is
+    processed are imported here too, so the first deposit doesn't wait for them either.
+    """
+    import asyncio  # noqa: F401
+    import quickxorhash  # noqa: F401
+    from bas_metadata_library.standards.iso_19115_2 import MetadataRecordConfigV3  # noqa: F401
+
+    logging.info("Warming up clients for deposits")
+    get_auth_token()
+    get_record_validator()
+    get_lookup_client()
+    get_graph_client().get(f"/drives/{sharepoint_drive_id}/root", params={"$select": "id"}).raise_for_status()
+
+
+class DepositJobHandler(socketserver.StreamRequestHandler):
+    """
+    Handles deposit jobs sent to `serve_deposits()` over a unix socket
+
+    Each line sent is a job (as parsed by `parse_deposit_job()`). The result for each job is sent back as a JSON line
+    once the job finishes. Jobs on the same connection are processed in order.
+    """
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if line.strip() == b"":
+                continue
+            try:
+                job = parse_deposit_job(job_data=line)
+                result = self.server.submit_job(job).result()
+            except (ValueError, RuntimeError, CancelledError) as e:
+                # RuntimeError and CancelledError are raised for jobs submitted or queued as the service stops
+                logging.error(f"Cannot process job from socket: {str(e) or 'service stopping'}")
+                result = {"status": "error", "deposit": None, "error": str(e) or "Service stopping", "context": None}
+            self.wfile.write((json.dumps(result) + "\n").encode())
+            self.wfile.flush()
+
+
+def watch_deposit_records(watch_path: Path, submit_job: Callable[[dict], Future], stopped: Event) -> None:
+    """
+    Deposit record files dropped into a directory, until stopped
+
+    Record files ('*.json') are moved into a 'processing' sub-directory while deposited, then into a 'done' or 'failed'
+    sub-directory, where each record is updated with download URLs for any artefacts deposited. Files changed in the
+    last `serve_watch_interval` seconds are skipped until a later check, in case they're still being written.
+    """
+    for sub_directory in ["processing", "done", "failed"]:
+        watch_path.joinpath(sub_directory).mkdir(parents=True, exist_ok=True)
+    # records left from a previous run that stopped mid-deposit are deposited again
+    for record_path in watch_path.joinpath("processing").glob("*.json"):
+        record_path.replace(watch_path.joinpath(record_path.name))
+
+    def finish_record(deposit: Future, processing_path: Path) -> None:
+        if deposit.cancelled():
+            # left in the processing directory, to be deposited again when next started
+            return
+        outcome_directory = "done" if deposit.result()["status"] == "ok" else "failed"
+        processing_path.replace(watch_path.joinpath(outcome_directory, processing_path.name))
+
+    logging.info(f"Watching for records in: '{watch_path.resolve()}'")
+    while not stopped.is_set():
+        for record_path in sorted(watch_path.glob("*.json")):
+            try:
+                if time() - record_path.stat().st_mtime < serve_watch_interval:
+                    continue
+                processing_path = watch_path.joinpath("processing", record_path.name)
+                record_path.replace(processing_path)
+            except FileNotFoundError:
+                continue
+            logging.info(f"Found record: '{record_path}'")
+            job = {"action": "deposit", "resource_id": None, "record_path": str(processing_path.resolve())}
+            submit_job(job).add_done_callback(lambda deposit, _path=processing_path: finish_record(deposit, _path))
+        stopped.wait(serve_watch_interval)
+
+
+def serve_deposits(
+    socket_path: Path, report_path: Path, watch_path: Optional[Path] = None, workers: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Process deposit jobs sent to a unix socket, or as records dropped into a watched directory, until interrupted
+
+    Unlike running a command for each deposit, clients and state (the Graph client and its connections, auth token,
+    schema validator and lookup client) are set up once and stay warm between deposits, so small deposits don't pay
+    for start-up costs each time.
+
+    Up to `workers` jobs are processed at once, from either source. Results are appended to a JSON Lines report as each
+    job finishes, as for `deposit_resources()`. When interrupted, jobs already started are finished before returning.
+
+    Returns the number of jobs that succeeded, and that failed.
+    """
+    if workers is None:
+        workers = deposit_batch_workers
+    if socket_path.exists():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as socket_client:
+            if socket_client.connect_ex(str(socket_path)) == 0:
+                logging.error(f"Socket '{socket_path.resolve()}' is in use by another service")
+                raise RuntimeError(f"Socket '{socket_path.resolve()}' is in use by another service")
+        # left from a service that didn't stop cleanly
+        socket_path.unlink()
+    get_graph_client(workers=workers)
+    warm_deposit_clients()
+
+    summary = {"ok": 0, "error": 0}
+    report_lock = Lock()
+    stopped = Event()
+    with ThreadPoolExecutor(max_workers=workers) as executor, open(report_path, mode="a") as report_file:
+
+        def report_job(deposit: Future) -> None:
+            if deposit.cancelled():
+                return
+            with report_lock:
+                report_deposit_result(result=deposit.result(), report_file=report_file, summary=summary)
+
+        def submit_job(job: dict) -> Future:
+            deposit = executor.submit(process_deposit_job, job=job)
+            deposit.add_done_callback(report_job)
+            return deposit
+
+        server = socketserver.ThreadingUnixStreamServer(str(socket_path), DepositJobHandler)
+        server.daemon_threads = True
+        server.submit_job = submit_job
+        watcher = None
+        if watch_path is not None:
+            watcher = Thread(target=watch_deposit_records, args=(watch_path, submit_job, stopped), daemon=True)
+            watcher.start()
+
+        logging.info(f"Accepting jobs on socket: '{socket_path.resolve()}'")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Stopping, waiting for jobs already started to finish")
+        finally:
+            stopped.set()
+            server.server_close()
+            socket_path.unlink(missing_ok=True)
+            if watcher is not None:
+                watcher.join()
+            # jobs not yet started are dropped, watched records for these jobs are deposited again when next started
+            executor.shutdown(wait=True, cancel_futures=True)
+    return summary
+
+
+def submit_deposit_job(job: dict, socket_path: Path) -> dict:
+    """
+    Submit a deposit job to a service started with `serve_deposits()`, waiting for and returning its result
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as socket_client:
+        socket_client.connect(str(socket_path))
+        socket_client.sendall((json.dumps(job) + "\n").encode())
+        socket_client.shutdown(socket.SHUT_WR)
+        with socket_client.makefile(mode="rb") as socket_file:
+            return json.loads(socket_file.readline())
+
+
 if __name__ == "__main__":
     # specific arguments selected to ignore child command parameters
     args = parser.parse_args(sys.argv[1:2])
 
     if args.command == "sign-in":
         auth_sign_in()
-        print("Ok. Signed in for next hour.")
+        print("Ok. Signed in, auth tokens will be refreshed as needed.")
         sys.exit(0)
 
     if args.command == "deposit":
@@ -611,12 +3263,19 @@ if __name__ == "__main__":
         parser.add_argument(
             "resource_id", help="Resource identifier, omit to list available options", nargs="?", default=None
         )
+        parser.add_argument(
+            "--deposit-concurrency",
+            help=f"Number of artefacts to deposit at once (default: {deposit_concurrency})",
+            type=int,
+            default=deposit_concurrency,
+        )
         # specific arguments selected to ignore parent command selection
         args = parser.parse_args(sys.argv[2:])
 
         if args.resource_id is None:
             print_resources()
             sys.exit(0)
+        deposit_concurrency = args.deposit_concurrency
 
         print(f"Depositing artefacts for resource: '{args.resource_id}' ...")
         if args.resource_id not in list_resources():
@@ -638,5 +3297,384 @@ if __name__ == "__main__":
                 print(exception.__cause__)
             sys.exit(1)
 
+    if args.command == "deposit-batch":
+        parser = ArgumentParser(description="Deposit artefacts listed in metadata records for many resources")
+        parser.add_argument("resource_ids", help="Resource identifiers", nargs="*", default=[])
+        parser.add_argument(
+            "--jobs",
+            help="JSON Lines file of jobs, each with a 'resource_id' or 'record_path' property",
+            type=Path,
+            default=None,
+        )
+        parser.add_argument(
+            "--workers",
+            help=f"Number of resources to deposit at once (default: {deposit_batch_workers})",
+            type=int,
+            default=deposit_batch_workers,
+        )
+        parser.add_argument(
+            "--report",
+            help=f"JSON Lines file to append results to (default: '{deposit_batch_report_path}')",
+            type=Path,
+            default=deposit_batch_report_path,
+        )
+        parser.add_argument(
+            "--deposit-concurrency",
+            help=f"Number of artefacts to deposit at once for each resource (default: {deposit_concurrency})",
+            type=int,
+            default=deposit_concurrency,
+        )
+        # specific arguments selected to ignore parent command selection
+        args = parser.parse_args(sys.argv[2:])
+        deposit_concurrency = args.deposit_concurrency
+
+        _jobs = [
+            {"action": "deposit", "resource_id": _resource_id, "record_path": None}
+            for _resource_id in args.resource_ids
+        ]
+        if args.jobs is not None:
+            try:
+                _jobs.extend(load_deposit_jobs(jobs_path=args.jobs))
+            except (OSError, RuntimeError) as exception:
+                print(f"No. {exception}.")
+                sys.exit(1)
+        if len(_jobs) == 0:
+            print("No. No resources to deposit, specify resource identifiers or a jobs file.")
+            sys.exit(1)
+
+        print(f"Depositing artefacts for {len(_jobs)} resources ...")
+        _summary = deposit_resources(jobs=_jobs, report_path=args.report, workers=args.workers)
+        print(
+            f"{'OK' if _summary['error'] == 0 else 'No'}. {_summary['ok']} resources deposited, "
+            f"{_summary['error']} failed. Results written to '{args.report.resolve()}'."
+        )
+        sys.exit(0 if _summary["error"] == 0 else 1)
+
+    if args.command == "ingest":
+        parser = ArgumentParser(description="Process deposit jobs streamed from a JSON Lines file or stdin")
+        parser.add_argument(
+            "jobs", help="JSON Lines file of jobs, each with a 'resource_id' and optional 'action', or '-' for stdin"
+        )
+        parser.add_argument(
+            "--restart", help="Process jobs from the start of the file, not the last checkpoint", action="store_true"
+        )
+        parser.add_argument(
+            "--workers",
+            help=f"Number of jobs to process at once (default: {deposit_batch_workers})",
+            type=int,
+            default=deposit_batch_workers,
+        )
+        parser.add_argument(
+            "--report",
+            help=f"JSON Lines file to append results to (default: '{deposit_batch_report_path}')",
+            type=Path,
+            default=deposit_batch_report_path,
+        )
+        parser.add_argument(
+            "--deposit-concurrency",
+            help=f"Number of artefacts to deposit at once for each resource (default: {deposit_concurrency})",
+            type=int,
+            default=deposit_concurrency,
+        )
+        # specific arguments selected to ignore parent command selection
+        args = parser.parse_args(sys.argv[2:])
+        deposit_concurrency = args.deposit_concurrency
+
+        if args.jobs == "-":
+            print("Processing jobs from stdin ...")
+            _summary = ingest_deposit_jobs(jobs_file=sys.stdin.buffer, report_path=args.report, workers=args.workers)
+        else:
+            _jobs_path = Path(args.jobs)
+            if args.restart:
+                delete_ingest_checkpoint(jobs_path=_jobs_path)
+            print(f"Processing jobs from '{_jobs_path.resolve()}' ...")
+            try:
+                with open(_jobs_path, mode="rb") as _jobs_file:
+                    _summary = ingest_deposit_jobs(
+                        jobs_file=_jobs_file, report_path=args.report, workers=args.workers, checkpoint_path=_jobs_path
+                    )
+            except OSError as exception:
+                print(f"No. {exception}.")
+                sys.exit(1)
+        print(
+            f"{'OK' if _summary['error'] == 0 else 'No'}. {_summary['ok']} jobs processed, "
+            f"{_summary['error']} failed. Results written to '{args.report.resolve()}'."
+        )
+        sys.exit(0 if _summary["error"] == 0 else 1)
+
+    if args.command == "serve":
+        parser = ArgumentParser(description="Run a long-lived service processing deposit jobs")
+        parser.add_argument(
+            "--socket",
+            help=f"Unix socket to accept jobs on (default: '{serve_socket_path}')",
+            type=Path,
+            default=serve_socket_path,
+        )
+        parser.add_argument("--watch", help="Directory to watch for record files to deposit", type=Path, default=None)
+        parser.add_argument(
+            "--workers",
+            help=f"Number of jobs to process at once (default: {deposit_batch_workers})",
+            type=int,
+            default=deposit_batch_workers,
+        )
+        parser.add_argument(
+            "--report",
+            help=f"JSON Lines file to append results to (default: '{deposit_batch_report_path}')",
+            type=Path,
+            default=deposit_batch_report_path,
+        )
+        parser.add_argument(
+            "--deposit-concurrency",
+            help=f"Number of artefacts to deposit at once for each resource (default: {deposit_concurrency})",
+            type=int,
+            default=deposit_concurrency,
+        )
+        # specific arguments selected to ignore parent command selection
+        args = parser.parse_args(sys.argv[2:])
+        deposit_concurrency = args.deposit_concurrency
+
+        # stop cleanly when run under a process manager, as for [ctrl+c]
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        print(f"Accepting deposit jobs on '{args.socket.resolve()}', press [ctrl+c] to stop ...")
+        try:
+            _summary = serve_deposits(
+                socket_path=args.socket, report_path=args.report, watch_path=args.watch, workers=args.workers
+            )
+        except (OSError, RuntimeError) as exception:
+            print(f"No. {exception}.")
+            sys.exit(1)
+        print(
+            f"OK. {_summary['ok']} jobs processed, {_summary['error']} failed. "
+            f"Results written to '{args.report.resolve()}'."
+        )
+        sys.exit(0)
+
+    if args.command == "submit":
+        parser = ArgumentParser(description="Submit a deposit job to a running service")
+        parser.add_argument("resource_id", help="Resource identifier", nargs="?", default=None)
+        parser.add_argument("--record", help="Record file to deposit, instead of a resource", type=Path, default=None)
+        parser.add_argument(
+            "--socket",
+            help=f"Unix socket the service accepts jobs on (default: '{serve_socket_path}')",
+            type=Path,
+            default=serve_socket_path,
+        )
+        # specific arguments selected to ignore parent command selection
+        args = parser.parse_args(sys.argv[2:])
+
+        if (args.resource_id is None) == (args.record is None):
+            print("No. Specify either a resource identifier or a record file.")
+            sys.exit(1)
+        _job = {"action": "deposit", "resource_id": args.resource_id, "record_path": None}
+        if args.record is not None:
+            # the service may not share this working directory
+            _job["record_path"] = str(args.record.resolve())
+
+        try:
+            _result = submit_deposit_job(job=_job, socket_path=args.socket)
+        except OSError as exception:
+            print(f"No. Unable to submit job to service on '{args.socket.resolve()}': {exception}.")
+            sys.exit(1)
+        if _result["status"] != "ok":
+            print(f"No. {_result['error']}.")
+            sys.exit(1)
+        print(f"OK. Artefacts for resource '{_result['resource_id']}' deposited.")
+        print(_result["deposit"])
+        sys.exit(0)
+
+    if args.command == "validate":
+        parser = ArgumentParser(description="Validate metadata records against the service specific JSON Schema")
+        parser.add_argument("paths", help="Record files, or directories of record files (*.json)", nargs="+", type=Path)
+        parser.add_argument(
+            "--workers", help="Number of records to validate at once (default: CPU count)", type=int, default=None
+        )
+        # specific arguments selected to ignore parent command selection
+        args = parser.parse_args(sys.argv[2:])
+
+        _record_paths: List[Path] = []
+        for _path in args.paths:
+            if _path.is_dir():
+                _record_paths.extend(sorted(_path.glob("*.json")))
+            else:
+                _record_paths.append(_path)
+
+        _invalid_count = 0
+        for _record_path, _validation_errors in validate_record_files(record_paths=_record_paths, workers=args.workers):
+            if len(_validation_errors) == 0:
+                continue
+            _invalid_count += 1
+            print(f"No. Record '{_record_path}' is not valid:")
+            for _validation_error in _validation_errors:
+                print(f"* {_validation_error}")
+        print(
+            f"{'OK' if _invalid_count == 0 else 'No'}. {len(_record_paths) - _invalid_count} records valid, "
+            f"{_invalid_count} not valid."
+        )
+        sys.exit(0 if _invalid_count == 0 else 1)
+
+    if args.command == "hash":
+        parser = ArgumentParser(description="Calculate quickXorHash values for local artefacts")
+        parser.add_argument("paths", help="Files, or directories of files (searched recursively)", nargs="+", type=Path)
+        parser.add_argument(
+            "--workers", help="Number of files to hash at once (default: CPU count)", type=int, default=None
+        )
+        parser.add_argument(
+            "--max-in-flight-bytes",
+            help=f"Total size of files to hash at once (default: {hash_max_in_flight_bytes})",
+            type=int,
+            default=hash_max_in_flight_bytes,
+        )
+        # specific arguments selected to ignore parent command selection
+        args = parser.parse_args(sys.argv[2:])
+
+        _file_paths: List[Path] = []
+        for _path in args.paths:
+            if _path.is_dir():
+                _file_paths.extend(sorted(_file_path for _file_path in _path.rglob("*") if _file_path.is_file()))
+            else:
+                _file_paths.append(_path)
+
+        _error_count = 0
+        for _file_path, _quickxor_hash, _error in hash_files(
+            file_paths=_file_paths, workers=args.workers, max_in_flight_bytes=args.max_in_flight_bytes
+        ):
+            if _error is not None:
+                _error_count += 1
+                print(f"No. File '{_file_path}' could not be hashed: {_error}", flush=True)
+                continue
+            print(f"{_quickxor_hash}  {_file_path}", flush=True)
+        print(
+            f"{'OK' if _error_count == 0 else 'No'}. {len(_file_paths) - _error_count} files hashed, "
+            f"{_error_count} not hashed."
+        )
+        sys.exit(0 if _error_count == 0 else 1)
+
+    if args.command == "clear-index":
+        parser = ArgumentParser(description="Clear the local index of SharePoint directories and files")
+        parser.add_argument(
+            "resource_ids", help="Resource identifiers to clear, omit to clear the whole index", nargs="*", default=[]
+        )
+        # specific arguments selected to ignore parent command selection
+        args = parser.parse_args(sys.argv[2:])
+
+        if len(args.resource_ids) == 0:
+            invalidate_indexed_items()
+            print("OK. Item index cleared.")
+            sys.exit(0)
+        for _resource_id in args.resource_ids:
+            invalidate_resource_index(resource_id=_resource_id)
+        print(f"OK. Item index cleared for {len(args.resource_ids)} resources.")
+        sys.exit(0)
+
+    if args.command == "sync":
+        parser = ArgumentParser(description="Sync a local mirror of SharePoint directories, files and metadata")
+        parser.add_argument("--full", help="Discard the local mirror and sync all items again", action="store_true")
+        # specific arguments selected to ignore parent command selection
+        args = parser.parse_args(sys.argv[2:])
+
+        try:
+            _summary = sync_sharepoint_drive(full=args.full)
+            print(
+                f"OK. Synced SharePoint drive, {_summary['changed']} items changed, {_summary['deleted']} deleted, "
+                f"{_summary['fields_changed']} with metadata changed."
+            )
+            sys.exit(0)
+        except RuntimeError as exception:
+            print(f"No. {exception}.")
+            print("")
+            print("=== context ===")
+            if hasattr(exception, "__cause__"):
+                print(exception.__cause__)
+            sys.exit(1)
+
+    if args.command == "links":
+        parser = ArgumentParser(description="Get sharing links for artefacts shared with all NERC staff")
+        parser.add_argument("resource_ids", help="Resource identifiers", nargs="+")
+        # specific arguments selected to ignore parent command selection
+        args = parser.parse_args(sys.argv[2:])
+
+        _error_count = 0
+        for _resource_id in args.resource_ids:
+            try:
+                for _artefact_id, _link_url in get_resource_sharing_links(resource_id=_resource_id).items():
+                    print(f"{_artefact_id}  {_link_url}")
+            except RuntimeError as exception:
+                _error_count += 1
+                print(f"No. {exception}.")
+        print(
+            f"{'OK' if _error_count == 0 else 'No'}. Sharing links for {len(args.resource_ids) - _error_count} "
+            f"resources, {_error_count} failed."
+        )
+        sys.exit(0 if _error_count == 0 else 1)
+
+    if args.command == "register":
+        parser = ArgumentParser(description="Register lookup items for artefacts with the Downloads Proxy")
+        parser.add_argument(
+            "lookup_items", help="JSON Lines file of lookup items, e.g. for previously deposited artefacts", type=Path
+        )
+        parser.add_argument(
+            "--concurrency",
+            help=f"Number of lookup items to register at once (default: {lookup_concurrency})",
+            type=int,
+            default=lookup_concurrency,
+        )
+        parser.add_argument(
+            "--endpoint", help="Lookup endpoint, e.g. for a local stand-in (default: live endpoint)", default=None
+        )
+        parser.add_argument("--no-sign", help="Don't sign requests, e.g. for a local stand-in", action="store_true")
+        # specific arguments selected to ignore parent command selection
+        args = parser.parse_args(sys.argv[2:])
+
+        try:
+            _lookup_items = load_lookup_items(lookup_items_path=args.lookup_items)
+        except (OSError, RuntimeError) as exception:
+            print(f"No. {exception}.")
+            sys.exit(1)
+
+        try:
+            _lookup_client = LookupClient(
+                endpoint=args.endpoint or lookup_endpoint, concurrency=args.concurrency, sign=not args.no_sign
+            )
+        except RuntimeError as exception:
+            print(f"No. {exception}.")
+            sys.exit(1)
+        _started_at = monotonic()
+        _error_count = 0
+        for _lookup_item, _error in _lookup_client.register_many(lookup_items=_lookup_items):
+            if _error is not None:
+                _error_count += 1
+                print(f"No. Artefact '{_lookup_item['artefact_id']}' not registered: {_error}", flush=True)
+        print(
+            f"{'OK' if _error_count == 0 else 'No'}. {len(_lookup_items) - _error_count} lookup items registered, "
+            f"{_error_count} failed, in {monotonic() - _started_at:.1f}s."
+        )
+        sys.exit(0 if _error_count == 0 else 1)
+
+    if args.command == "lookups":
+        parser = ArgumentParser(description="List or export registered lookup items, as JSON Lines")
+        parser.add_argument("--resource-id", help="Only include lookup items for this resource", default=None)
+        parser.add_argument("--artefact-id", help="Only include the lookup item for this artefact", default=None)
+        parser.add_argument("--origin-uri", help="Only include lookup items for this origin URI", default=None)
+        parser.add_argument("--export", help="JSON Lines file to export lookup items to", type=Path, default=None)
+        # specific arguments selected to ignore parent command selection
+        args = parser.parse_args(sys.argv[2:])
+
+        if args.export is not None:
+            with open(args.export, mode="w") as _export_file:
+                _exported_count = export_stored_lookup_items(
+                    export_file=_export_file,
+                    resource_id=args.resource_id,
+                    artefact_id=args.artefact_id,
+                    origin_uri=args.origin_uri,
+                )
+            print(f"OK. {_exported_count} lookup items exported to '{args.export.resolve()}'.")
+            sys.exit(0)
+
+        for _lookup_item in get_stored_lookup_items(
+            resource_id=args.resource_id, artefact_id=args.artefact_id, origin_uri=args.origin_uri
+        ):
+            print(json.dumps(_lookup_item))
+        sys.exit(0)
+
     print("No. Unrecognised command, run with `--help` for available commands.")
     sys.exit(1)
@@ -0,0 +1,160 @@
+"""
+Benchmark for reading artefacts as chunks for uploading and hashing.
+
+Compares reading each chunk into a new bytes object (as `upload_sharepoint_file()` in `test-chain.py` did originally),
+with the memory mapped chunk source now used for uploads (`map_file()`), in terms of peak memory use (RSS) and CPU time.
+
+Each approach runs in a separate process, so peak memory use is measured independently. Chunks are hashed and then
+'uploaded' by writing them to /dev/null. Session chunks are uploaded in order, so by default each chunk is released
+before the next is read. `concurrency` keeps up to that many chunks at once, to model artefacts uploading in parallel.
+"""
+
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+from argparse import SUPPRESS, ArgumentParser
+from collections import deque
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import monotonic
+
+import quickxorhash
+
+
+def load_chain_module():
+    # `test-chain.py` isn't importable by name
+    chain_spec = importlib.util.spec_from_file_location("test_chain", Path(__file__).parent.joinpath("test-chain.py"))
+    chain_module = importlib.util.module_from_spec(chain_spec)
+    chain_spec.loader.exec_module(chain_module)
+    return chain_module
+
+
+def make_file(file_path: Path, file_size: int) -> None:
+    block = os.urandom(2**20)
+    with open(file_path, mode="wb") as bench_file:
+        for _ in range(file_size // len(block)):
+            bench_file.write(block)
+        bench_file.write(block[: file_size % len(block)])
+
+
+def run_read(file_path: Path, chunk_size: int, concurrency: int) -> str:
+    quickxor = quickxorhash.quickxorhash()
+    chunks_in_flight = deque(maxlen=concurrency)
+    with open(file_path, mode="rb") as src_file, open(os.devnull, mode="wb") as dst_file:
+        while True:
+            chunk_data = src_file.read(chunk_size)
+            if not chunk_data:
+                break
+            quickxor.update(chunk_data)
+            dst_file.write(chunk_data)
+            chunks_in_flight.append(chunk_data)
+    return quickxor.digest().hex()
+
+
+def release_chunk(chain, file_view: memoryview, chunks_in_flight: deque) -> None:
+    chunk_start, chunk_data = chunks_in_flight.popleft()
+    chain.release_file_chunk(file_view=file_view, chunk_start=chunk_start, chunk_end=chunk_start + len(chunk_data))
+    chunk_data.release()
+
+
+def run_mmap(file_path: Path, chunk_size: int, concurrency: int) -> str:
+    chain = load_chain_module()
+    quickxor = quickxorhash.quickxorhash()
+    # empty files can't be memory mapped
+    if file_path.stat().st_size == 0:
+        return quickxor.digest().hex()
+
+    chunks_in_flight = deque()
+    with chain.map_file(file_path=file_path) as file_view, open(os.devnull, mode="wb") as dst_file:
+        for chunk_start in range(0, len(file_view), chunk_size):
+            chunk_data = file_view[chunk_start : chunk_start + chunk_size]
+            quickxor.update(chunk_data.tobytes())
+            dst_file.write(chunk_data)
+            chunks_in_flight.append((chunk_start, chunk_data))
+            del chunk_data
+            if len(chunks_in_flight) > concurrency:
+                release_chunk(chain=chain, file_view=file_view, chunks_in_flight=chunks_in_flight)
+        # slices of the view must be released before the memory map can be closed
+        while len(chunks_in_flight) > 0:
+            release_chunk(chain=chain, file_view=file_view, chunks_in_flight=chunks_in_flight)
+    return quickxor.digest().hex()
+
+
+def measure(method: str, file_path: Path, chunk_size: int, concurrency: int) -> dict:
+    # run in a separate process so peak memory use only reflects the method being measured
+    result = subprocess.run(
+        [
+            sys.executable,
+            __file__,
+            "--run",
+            method,
+            str(file_path),
+            "--chunk-size",
+            str(chunk_size),
+            "--concurrency",
+            str(concurrency),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark chunk sources for uploading and hashing artefacts")
+    parser.add_argument(
+        "--sizes", help="File sizes to test in GiB (default: 1 10)", nargs="+", type=float, default=[1, 10]
+    )
+    parser.add_argument("--chunk-size", help="Chunk size in bytes (default: 327680)", type=int, default=327680)
+    parser.add_argument("--concurrency", help="Chunks kept at once (default: 1)", type=int, default=1)
+    parser.add_argument("--dir", help="Directory for test files (default: system temp directory)", default=None)
+    parser.add_argument("--run", help=SUPPRESS, nargs=2, default=None)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        _method, _file_path = args.run
+        # loaded for both methods so each starts from the same baseline
+        load_chain_module()
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        started_at = monotonic()
+        _hash = {"read": run_read, "mmap": run_mmap}[_method](
+            file_path=Path(_file_path), chunk_size=args.chunk_size, concurrency=args.concurrency
+        )
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_time = (usage.ru_utime + usage.ru_stime) - (usage_before.ru_utime + usage_before.ru_stime)
+        # `ru_maxrss` is in bytes on macOS and kilobytes elsewhere
+        max_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        print(
+            json.dumps(
+                {
+                    "hash": _hash,
+                    "max_rss": max_rss,
+                    "cpu_time": round(cpu_time, 3),
+                    "wall_time": round(monotonic() - started_at, 3),
+                }
+            )
+        )
+        sys.exit(0)
+
+    print(f"{'size':>8} {'method':>6} {'peak RSS (MiB)':>15} {'CPU time (s)':>13} {'wall time (s)':>14}")
+    with TemporaryDirectory(dir=args.dir) as tmp_dir:
+        for size in args.sizes:
+            bench_path = Path(tmp_dir).joinpath("bench.bin")
+            make_file(file_path=bench_path, file_size=int(size * 2**30))
+            results = {}
+            for method in ["read", "mmap"]:
+                results[method] = measure(
+                    method=method, file_path=bench_path, chunk_size=args.chunk_size, concurrency=args.concurrency
+                )
+                print(
+                    f"{size:>6}GB {method:>6} {results[method]['max_rss'] / 2**20:>15.1f} "
+                    f"{results[method]['cpu_time']:>13.2f} {results[method]['wall_time']:>14.2f}"
+                )
+            if results["read"]["hash"] != results["mmap"]["hash"]:
+                print("No. Hashes for chunk sources do not match.")
+                sys.exit(1)
+            bench_path.unlink()
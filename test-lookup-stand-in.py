@@ -0,0 +1,102 @@
+"""
+Local stand-in for the lookup endpoint (Lambda function URL) used by the Downloads Proxy.
+
+Accepts lookup items in the same way as the real endpoint (one JSON lookup item per POST request), so lookup
+registration (`LookupClient` in `test-chain.py`) can be tested without AWS access or changing real lookup items.
+
+Requests aren't authenticated. Latency, throttling and failures can be simulated to check retries and concurrency.
+Registered lookup items are appended to a JSON Lines file if set.
+"""
+
+import json
+import random
+import sys
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock
+from time import sleep
+from typing import Dict, Optional
+
+lookup_item_keys = ["resource_id", "artefact_id", "media_type", "origin_uri"]
+
+
+class StandInState:
+    delay: float = 0
+    fail_rate: float = 0
+    throttle_rate: float = 0
+    output_path: Optional[Path] = None
+    lookup_items: Dict[str, dict] = {}
+    lock = Lock()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _respond(self, status_code: int, body: dict, headers: Optional[Dict[str, str]] = None) -> None:
+        response_body = json.dumps(body).encode()
+        self.send_response(status_code)
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def do_POST(self) -> None:
+        request_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        sleep(random.uniform(0, StandInState.delay * 2))
+
+        if random.random() < StandInState.throttle_rate:
+            self._respond(429, {"message": "Too Many Requests"}, headers={"Retry-After": "1"})
+            return
+        if random.random() < StandInState.fail_rate:
+            self._respond(503, {"message": "Service Unavailable"})
+            return
+
+        try:
+            lookup_item = json.loads(request_body)
+            lookup_item = {key: lookup_item[key] for key in lookup_item_keys}
+        except (json.JSONDecodeError, KeyError, TypeError):
+            self._respond(400, {"message": f"Lookup item must be an object with {', '.join(lookup_item_keys)}"})
+            return
+
+        with StandInState.lock:
+            StandInState.lookup_items[lookup_item["artefact_id"]] = lookup_item
+            if StandInState.output_path is not None:
+                with open(StandInState.output_path, mode="a") as output_file:
+                    output_file.write(json.dumps(lookup_item) + "\n")
+        self._respond(201, lookup_item)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Local stand-in for the Downloads Proxy lookup endpoint")
+    parser.add_argument("--port", help="Port to listen on (default: 9000)", type=int, default=9000)
+    parser.add_argument("--delay", help="Mean response delay in seconds (default: 0.05)", type=float, default=0.05)
+    parser.add_argument(
+        "--fail-rate", help="Proportion of requests to fail with a 503 (default: 0)", type=float, default=0
+    )
+    parser.add_argument(
+        "--throttle-rate", help="Proportion of requests to throttle with a 429 (default: 0)", type=float, default=0
+    )
+    parser.add_argument(
+        "--output", help="JSON Lines file to append registered lookup items to", type=Path, default=None
+    )
+    args = parser.parse_args()
+
+    StandInState.delay = args.delay
+    StandInState.fail_rate = args.fail_rate
+    StandInState.throttle_rate = args.throttle_rate
+    StandInState.output_path = args.output
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StandInHandler)
+    print(f"Lookup endpoint stand-in listening on 'http://127.0.0.1:{args.port}/', press [ctrl+c] to stop ...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    print(f"OK. {len(StandInState.lookup_items)} lookup items registered.")
+    sys.exit(0)
@@ -0,0 +1,144 @@
+"""
+Benchmark for start-up time of commands in `test-chain.py`.
+
+`test-chain.py` imports dependencies where they're used, rather than when loaded, so each command only imports what it
+needs. This runs commands that don't need network access or sign-in with `-X importtime`, to check which dependencies
+each command imports and how long imports take (excluding interpreter start-up, i.e. up to and including `site`).
+Commands use a copy of the service schema without refs to remote schemas, so `validate` doesn't need network access.
+
+Exits with an error if a command imports a dependency it doesn't need, if a command that shouldn't import any
+dependencies takes longer than `--max-import-time` to import modules, or if a command exits with a different exit code
+than expected (i.e. it failed, so its imports aren't representative), so regressions are caught when run as a check.
+"""
+
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import monotonic
+from typing import Dict, List, Tuple
+
+# dependencies that are slow to import, and only imported by commands that use them
+heavy_modules = [
+    "asyncio",
+    "bas_metadata_library",
+    "jsonschema",
+    "msal",
+    "quickxorhash",
+    "requests",
+    "requests_auth_aws_sigv4",
+]
+
+chain_path = Path(__file__).parent.joinpath("test-chain.py").resolve()
+artefact_path = Path(__file__).parent.joinpath("test-artefact.txt").resolve()
+record_path = Path(__file__).parent.joinpath("test-record.json").resolve()
+
+# arguments for each command, its expected exit code, and the dependencies it may import
+commands: List[Tuple[List[str], int, List[str]]] = [
+    (["--help"], 0, []),
+    (["deposit", "--help"], 0, []),
+    # no service is running, so submitting a job fails
+    (["submit", "--socket", "missing.sock", "foo"], 1, []),
+    (["lookups"], 0, []),
+    (["hash", str(artefact_path)], 0, ["quickxorhash"]),
+    # jsonschema imports requests to fetch remote schemas, even where a schema doesn't reference any
+    (["validate", str(record_path)], 0, ["bas_metadata_library", "jsonschema", "requests"]),
+]
+
+
+def remove_remote_refs(schema: object) -> object:
+    """
+    Replace refs to remote schemas (i.e. the base record configuration schema) with an empty schema, allowing any value
+
+    Records are still validated against the base schema by `bas_metadata_library`, using its own local copy.
+    """
+    if isinstance(schema, dict):
+        if str(schema.get("$ref", "")).startswith(("http://", "https://")):
+            return {}
+        return {key: remove_remote_refs(value) for key, value in schema.items()}
+    if isinstance(schema, list):
+        return [remove_remote_refs(value) for value in schema]
+    return schema
+
+
+def parse_import_times(import_times: str) -> Tuple[float, List[str]]:
+    """
+    Parse output from `-X importtime`, returning the total import time in milliseconds, and modules imported
+
+    Only imports after interpreter start-up (i.e. after `site` has been imported) are included.
+    """
+    entries = []
+    for line in import_times.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        entries.append((int(cumulative), name.rstrip()))
+
+    site_index = max([index for index, (_, name) in enumerate(entries) if name.strip() == "site"], default=-1)
+    entries = entries[site_index + 1 :]
+    # top level imports (not indented) include the time taken for the imports nested under them
+    total = sum([cumulative for cumulative, name in entries if not name.startswith("  ")]) / 1000
+    return total, [name.strip() for _, name in entries]
+
+
+def measure(command: List[str], work_dir: Path) -> Dict[str, object]:
+    started_at = monotonic()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(chain_path), *command], cwd=work_dir, capture_output=True, text=True
+    )
+    wall_time = (monotonic() - started_at) * 1000
+    import_time, modules = parse_import_times(import_times=result.stderr)
+    return {"import_time": import_time, "wall_time": wall_time, "modules": modules, "exit_code": result.returncode}
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark start-up time of commands in test-chain.py")
+    parser.add_argument(
+        "--repeat", help="Number of times to run each command, fastest run is used (default: 5)", type=int, default=5
+    )
+    parser.add_argument(
+        "--max-import-time",
+        help="Import time allowed for commands that don't import dependencies, in ms (default: 100)",
+        type=float,
+        default=100,
+    )
+    args = parser.parse_args()
+
+    regressions = []
+    print(f"{'command':>10} {'import time (ms)':>17} {'wall time (ms)':>15}  dependencies")
+    # commands are run in an empty directory, so state (e.g. the state database) isn't changed
+    with TemporaryDirectory() as tmp_dir:
+        with open(chain_path.parent.joinpath("schema.json"), mode="r") as schema_file:
+            schema = remove_remote_refs(json.load(schema_file))
+        with open(Path(tmp_dir).joinpath("schema.json"), mode="w") as schema_file:
+            json.dump(schema, schema_file, indent=2)
+        for command, expected_exit_code, allowed_modules in commands:
+            results = [measure(command=command, work_dir=Path(tmp_dir)) for _ in range(args.repeat)]
+            import_time = min([result["import_time"] for result in results])
+            wall_time = min([result["wall_time"] for result in results])
+            imported_modules = sorted(
+                {module.split(".")[0] for module in results[0]["modules"] if module.split(".")[0] in heavy_modules}
+            )
+            print(f"{command[0]:>10} {import_time:>17.1f} {wall_time:>15.1f}  {', '.join(imported_modules) or '-'}")
+
+            exit_codes = sorted(
+                {result["exit_code"] for result in results if result["exit_code"] != expected_exit_code}
+            )
+            if len(exit_codes) > 0:
+                regressions.append(
+                    f"'{' '.join(command)}' exits with {', '.join([str(code) for code in exit_codes])}, "
+                    f"not {expected_exit_code}"
+                )
+            for module in imported_modules:
+                if module not in allowed_modules:
+                    regressions.append(f"'{' '.join(command)}' imports '{module}'")
+            if len(allowed_modules) == 0 and import_time > args.max_import_time:
+                regressions.append(f"'{' '.join(command)}' imports take {import_time:.1f}ms")
+
+    if len(regressions) > 0:
+        print(f"No. Start-up regressions found: {'; '.join(regressions)}.")
+        sys.exit(1)
+    print("OK. No start-up regressions found.")
+    sys.exit(0)